@@ -0,0 +1,337 @@
+"""
+Actor-learner training on a single machine.  Actor processes play self-play games
+continuously with the latest weights while one learner process, the one calling
+ActorLearner.run, trains on a replay buffer of their positions.
+
+    trainer = ActorLearner(DualNetFactory(num_convolutional_filters=64), env, n_actors=4)
+    counters = trainer.run(n_training_steps=1000)
+
+Finished games reach the learner through a queue.  New weights are written to a shared
+memory block that actors copy from between games, so weights are never pickled.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import time
+
+import numpy as np
+
+from game import self_play_game
+
+# byte alignment of each array in the shared weights block
+WEIGHT_ALIGNMENT = 64
+
+
+class DualNetFactory(object):
+    """
+    Builds a DualNet in its own graph and session with freshly initialized variables.
+    Factories are picklable, so they can be sent to actor processes, which then build their
+    own net.  Keyword arguments are passed to DualNet.
+
+    Parameters
+    ----------
+    intra_op_threads, inter_op_threads: int
+        thread pool sizes of the net's session, see dual_net.make_session
+    """
+    def __init__(self, intra_op_threads=0, inter_op_threads=0, **dual_net_kwargs):
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.dual_net_kwargs = dual_net_kwargs
+
+    def __call__(self, env, inference_only=False):
+        import tensorflow as tf
+        from dual_net import DualNet, make_session
+
+        graph = tf.Graph()
+        with graph.as_default():
+            sess = make_session(self.intra_op_threads, self.inter_op_threads, graph=graph)
+            net = DualNet(sess, env, inference_only=inference_only, **self.dual_net_kwargs)
+            sess.run(tf.global_variables_initializer())
+        return net
+
+
+class WeightBroadcast(object):
+    """
+    A shared memory block holding a dict of weight arrays, plus a version number bumped on
+    every publish.  The learner publishes, actors fetch when the version has moved on.  A
+    lock keeps readers from seeing a half written set of weights.
+
+    Create one with WeightBroadcast.create in the learner and pass it to the actor processes.
+    """
+    def __init__(self, shm, layout, lock, version):
+        self.shm = shm
+        # list of (name, shape, dtype, offset) describing where each array lives in shm
+        self.layout = layout
+        self.lock = lock
+        self.version = version
+
+    @classmethod
+    def create(cls, weights, context=multiprocessing):
+        layout = []
+        offset = 0
+        for name in sorted(weights):
+            array = np.asarray(weights[name])
+            layout.append((name, array.shape, array.dtype.str, offset))
+            offset += -(-array.nbytes // WEIGHT_ALIGNMENT) * WEIGHT_ALIGNMENT
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        return cls(shm, layout, context.Lock(), context.Value('q', 0, lock=False))
+
+    def _arrays(self):
+        return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+                for name, shape, dtype, offset in self.layout}
+
+    def publish(self, weights):
+        """
+        Writes weights, a dict with the same names and shapes as those the broadcast was
+        created with, and returns the new version
+        """
+        with self.lock:
+            arrays = self._arrays()
+            for name, array in arrays.items():
+                array[...] = weights[name]
+            del arrays
+            self.version.value += 1
+            return self.version.value
+
+    def fetch(self, known_version=0):
+        """
+        Returns a tuple of (version, weights), where weights is None if nothing newer than
+        known_version has been published.  The weights are copies, so they stay valid after
+        the next publish.
+        """
+        with self.lock:
+            version = self.version.value
+            if version <= known_version:
+                return version, None
+            arrays = self._arrays()
+            weights = {name: array.copy() for name, array in arrays.items()}
+            del arrays
+        return version, weights
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class StageCounters(object):
+    """
+    Throughput counters shared between the learner and the actors.  Every process adds to
+    them, and as_dict reports totals along with rates over the time since they were created.
+    """
+    NAMES = ('games', 'positions', 'self_play_seconds', 'weight_updates', 'positions_received',
+             'queue_wait_seconds', 'train_steps', 'positions_trained', 'train_seconds', 'weights_published')
+
+    def __init__(self, context=multiprocessing):
+        self.values = context.Array('d', len(self.NAMES))
+        self.start_time = time.time()
+
+    def add(self, name, amount=1):
+        index = self.NAMES.index(name)
+        with self.values.get_lock():
+            self.values[index] += amount
+
+    def as_dict(self):
+        with self.values.get_lock():
+            counters = dict(zip(self.NAMES, self.values[:]))
+        elapsed = time.time() - self.start_time
+        counters['wall_seconds'] = elapsed
+        counters['games_per_second'] = counters['games'] / elapsed
+        counters['positions_per_second'] = counters['positions'] / elapsed
+        counters['train_steps_per_second'] = counters['train_steps'] / elapsed
+        counters['positions_trained_per_second'] = counters['positions_trained'] / elapsed
+        return counters
+
+
+class ReplayBuffer(object):
+    """
+    Fixed size store of (state, action distribution, outcome) training positions.  Once it is
+    full, the oldest positions are overwritten.
+
+    Parameters
+    ----------
+    capacity: int
+        number of positions kept
+    state_shape: tuple
+        shape of a single state
+    action_size: int
+        length of an action distribution
+    """
+    def __init__(self, capacity, state_shape, action_size, state_dtype=np.uint8, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros((capacity,) + tuple(state_shape), dtype=state_dtype)
+        self.action_distributions = np.zeros((capacity, action_size), dtype=np.float32)
+        self.outcomes = np.zeros(capacity, dtype=np.float32)
+        self.n_added = 0
+        self.rng = np.random.RandomState(seed)
+
+    def __len__(self):
+        return min(self.n_added, self.capacity)
+
+    def add(self, states, action_distributions, outcomes):
+        for i in range(len(states)):
+            index = self.n_added % self.capacity
+            self.states[index] = states[i]
+            self.action_distributions[index] = action_distributions[i]
+            self.outcomes[index] = outcomes[i]
+            self.n_added += 1
+
+    def sample(self, batch_size):
+        """
+        Returns a tuple of (states, action_distributions, outcomes) for batch_size positions
+        drawn uniformly with replacement
+        """
+        indices = self.rng.randint(0, len(self), batch_size)
+        return self.states[indices], self.action_distributions[indices], self.outcomes[indices]
+
+
+def run_actor(actor_id, model_factory, env, broadcast, game_queue, counters, stop_event, self_play_kwargs,
+              seed=None):
+    """
+    Plays self-play games until stop_event is set, putting each finished game on game_queue
+    as a tuple of (states, outcomes, action_distributions).  The model's weights are
+    refreshed from broadcast before every game.
+    """
+    if seed is not None:
+        np.random.seed(seed + actor_id)
+    model = model_factory(env, inference_only=True)
+    known_version = 0
+    try:
+        while not stop_event.is_set():
+            known_version, weights = broadcast.fetch(known_version)
+            if weights is not None:
+                model.set_weights(weights)
+                counters.add('weight_updates')
+
+            start_time = time.perf_counter()
+            states, outcomes, action_distributions = self_play_game(model, env, **self_play_kwargs)
+            counters.add('self_play_seconds', time.perf_counter() - start_time)
+            if len(states) == 0:
+                continue
+            game_queue.put((states, outcomes, action_distributions))
+            counters.add('games')
+            counters.add('positions', len(states))
+    finally:
+        broadcast.close()
+
+
+class ActorLearner(object):
+    """
+    Runs self-play actors in separate processes and trains a model on their games in this one.
+
+    Parameters
+    ----------
+    model_factory: function
+        model_factory(env, inference_only) returns a model with get_weights, set_weights and
+        train methods, such as a DualNetFactory.  It must be picklable, like env.
+    env:
+        game playing environment
+    n_actors: int
+        number of self-play processes
+    replay_capacity: int
+        number of positions kept in the replay buffer
+    batch_size: int
+        positions per training step
+    publish_every: int
+        training steps between weight broadcasts to the actors
+    min_replay_size: int
+        positions to collect before training starts, batch_size if not given
+    self_play_kwargs: dict
+        keyword arguments for self_play_game in the actors
+    seed: int
+        optional seed, actors are seeded with seed + their id
+    """
+    def __init__(self,
+                 model_factory,
+                 env,
+                 n_actors=2,
+                 replay_capacity=100000,
+                 batch_size=32,
+                 publish_every=10,
+                 min_replay_size=None,
+                 self_play_kwargs=None,
+                 seed=None):
+        self.model_factory = model_factory
+        self.env = env
+        self.n_actors = n_actors
+        self.batch_size = batch_size
+        self.publish_every = publish_every
+        self.min_replay_size = batch_size if min_replay_size is None else min_replay_size
+        self.self_play_kwargs = self_play_kwargs or {}
+        self.seed = seed
+        # spawn so actors don't inherit the learner's TensorFlow runtime and threads
+        self.context = multiprocessing.get_context('spawn')
+        self.model = model_factory(env, inference_only=False)
+        self.replay_buffer = ReplayBuffer(replay_capacity, env.input_shape, env.action_size, env.state_dtype, seed)
+        self.counters = None
+
+    def run(self, n_training_steps):
+        """
+        Trains for n_training_steps steps while the actors play, then stops the actors.
+        Returns the counters as a dict.
+        """
+        self.counters = StageCounters(self.context)
+        broadcast = WeightBroadcast.create(self.model.get_weights(), self.context)
+        broadcast.publish(self.model.get_weights())
+        game_queue = self.context.Queue()
+        stop_event = self.context.Event()
+        actors = [self.context.Process(target=run_actor,
+                                       args=(actor_id, self.model_factory, self.env, broadcast, game_queue,
+                                             self.counters, stop_event, self.self_play_kwargs, self.seed),
+                                       daemon=True)
+                  for actor_id in range(self.n_actors)]
+        for actor in actors:
+            actor.start()
+        try:
+            self._train(n_training_steps, broadcast, game_queue, actors)
+        finally:
+            stop_event.set()
+            # empty the queue so actors blocked on flushing it can exit
+            for actor in actors:
+                while actor.is_alive():
+                    self._drain(game_queue)
+                    actor.join(timeout=0.1)
+            broadcast.close()
+            broadcast.unlink()
+        return self.counters.as_dict()
+
+    def _drain(self, game_queue, timeout=None):
+        # moves every game waiting on the queue into the replay buffer, waiting up to timeout
+        # for the first one.  Returns the number of games received.
+        n_games = 0
+        while True:
+            try:
+                if n_games == 0 and timeout is not None:
+                    states, outcomes, action_distributions = game_queue.get(timeout=timeout)
+                else:
+                    states, outcomes, action_distributions = game_queue.get_nowait()
+            except queue.Empty:
+                return n_games
+            self.replay_buffer.add(states, action_distributions, outcomes)
+            self.counters.add('positions_received', len(states))
+            n_games += 1
+
+    def _train(self, n_training_steps, broadcast, game_queue, actors):
+        n_steps = 0
+        while n_steps < n_training_steps:
+            if len(self.replay_buffer) < self.min_replay_size:
+                start_time = time.perf_counter()
+                self._drain(game_queue, timeout=1.0)
+                self.counters.add('queue_wait_seconds', time.perf_counter() - start_time)
+                if not any(actor.is_alive() for actor in actors):
+                    raise RuntimeError('Every actor process has exited')
+                continue
+            self._drain(game_queue)
+
+            states, action_distributions, outcomes = self.replay_buffer.sample(self.batch_size)
+            start_time = time.perf_counter()
+            self.model.train(states, action_distributions, outcomes)
+            self.counters.add('train_seconds', time.perf_counter() - start_time)
+            self.counters.add('train_steps')
+            self.counters.add('positions_trained', self.batch_size)
+            n_steps += 1
+
+            if n_steps % self.publish_every == 0:
+                broadcast.publish(self.model.get_weights())
+                self.counters.add('weights_published')
@@ -0,0 +1,266 @@
+"""
+Benchmarks for the hot paths of castle: environment operations, MCTS rollouts and the
+DualNet forward and training passes.  Nothing here needs network access or Stockfish.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --sections env mcts --output bench.json
+    python benchmark.py --sections session --thread-settings 1,1 4,1 0,0
+
+Results are written as JSON so that runs can be compared with each other.
+"""
+import argparse
+from functools import partial
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from chess_env import ChessEnv
+from game import BatchRandomModel
+from kqk_chess_env import KQKChessEnv, KQK_CHESS_INPUT_SHAPE
+from mcts import exploration_bonus_for_c_puct, perform_rollouts
+from tictactoe_env import TicTacToeEnv
+from tree import Node
+
+# the mock models and envs from the tests are cheap stand ins that isolate the search cost
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests'))
+from utils import mock_model, mock_model_numline, mock_env, numline_env  # noqa: E402
+
+SECTIONS = ('env', 'mcts', 'net', 'session')
+DEFAULT_BATCH_SIZES = (1, 8, 32, 128)
+# (intra_op_threads, inter_op_threads) pairs for the session section, 0 lets TensorFlow choose
+DEFAULT_THREAD_SETTINGS = ((1, 1), (2, 1), (4, 1), (0, 0))
+
+
+def time_function(function, n_calls, n_repeats=3):
+    """
+    Calls function n_calls times, n_repeats times over, and returns a dict of timings.
+    The best repeat is the least noisy estimate of the cost of a call.
+    """
+    totals = []
+    for _ in range(n_repeats):
+        start_time = time.perf_counter()
+        for _ in range(n_calls):
+            function()
+        totals.append(time.perf_counter() - start_time)
+    best = min(totals)
+    return {'n_calls': n_calls,
+            'n_repeats': n_repeats,
+            'best_total_s': best,
+            'mean_total_s': float(np.mean(totals)),
+            'seconds_per_call': best / n_calls,
+            'calls_per_second': n_calls / best if best > 0 else float('inf')}
+
+
+def kqk_start_state():
+    # same position as the KQK game test: white king a3, white queen c1, black king d4
+    state = np.zeros(KQK_CHESS_INPUT_SHAPE, dtype=np.uint8)
+    state[0, 2, 0] = 1
+    state[2, 0, 1] = 1
+    state[3, 3, 2] = 1
+    state[:, :, 3] = 1
+    return state
+
+
+def benchmark_env(name, env, state, n_calls, n_repeats):
+    action = env.get_legal_actions(state)[0]
+    operations = [('get_next_state', lambda: env.get_next_state(state, action)),
+                  ('get_legal_actions', lambda: env.get_legal_actions(state)),
+                  ('get_legality_mask', lambda: env.get_legality_mask(state)),
+                  ('is_game_over', lambda: env.is_game_over(state)),
+                  ('hash_state', lambda: env.hash_state(state))]
+    results = []
+    for operation, function in operations:
+        result = time_function(function, n_calls, n_repeats)
+        result['name'] = 'env/{}/{}'.format(name, operation)
+        results.append(result)
+    return results
+
+
+def env_benchmarks(n_calls, n_repeats):
+    tictactoe_env = TicTacToeEnv()
+    tictactoe_state = tictactoe_env.get_next_state(tictactoe_env.reset(), 4)
+    results = benchmark_env('tictactoe', tictactoe_env, tictactoe_state, n_calls, n_repeats)
+
+    kqk_env = KQKChessEnv('KQK_conv', 'KQK_pos_pos_piece')
+    results += benchmark_env('kqk', kqk_env, kqk_start_state(), n_calls, n_repeats)
+
+    chess_env = ChessEnv()
+    results += benchmark_env('chess', chess_env, chess_env.reset(), n_calls, n_repeats)
+    return results
+
+
+def benchmark_rollouts(name, model, env, start_state, n_leaf_expansions, n_repeats, c_puct=1.0):
+    exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c_puct)
+
+    def search():
+        perform_rollouts(Node(start_state), n_leaf_expansions, model, env, exploration_bonus)
+    result = time_function(search, 1, n_repeats)
+    result['name'] = 'mcts/{}'.format(name)
+    result['n_leaf_expansions'] = n_leaf_expansions
+    result['nodes_per_second'] = n_leaf_expansions / result['best_total_s']
+    return result
+
+
+def mcts_benchmarks(n_leaf_expansions, n_repeats):
+    tictactoe_env = TicTacToeEnv()
+    kqk_env = KQKChessEnv('KQK_conv', 'KQK_pos_pos_piece')
+    return [benchmark_rollouts('mock', mock_model, mock_env, 0, n_leaf_expansions, n_repeats, c_puct=100),
+            benchmark_rollouts('numline', mock_model_numline, numline_env, 0, n_leaf_expansions, n_repeats,
+                               c_puct=100),
+            benchmark_rollouts('tictactoe_random', BatchRandomModel(tictactoe_env, seed=0), tictactoe_env,
+                               tictactoe_env.reset(), n_leaf_expansions, n_repeats),
+            benchmark_rollouts('kqk_random', BatchRandomModel(kqk_env, seed=0), kqk_env, kqk_start_state(),
+                               n_leaf_expansions, n_repeats)]
+
+
+def net_benchmarks(batch_sizes, n_calls, n_repeats, num_convolutional_filters, n_residual_layers):
+    import tensorflow as tf
+    from dual_net import DualNet
+
+    env = KQKChessEnv('KQK_conv', 'KQK_pos_pos')
+    results = []
+    with tf.Graph().as_default():
+        sess = tf.Session()
+        net = DualNet(sess, env,
+                      num_convolutional_filters=num_convolutional_filters,
+                      n_residual_layers=n_residual_layers)
+        sess.run(tf.global_variables_initializer())
+        for batch_size in batch_sizes:
+            states = np.array([kqk_start_state()] * batch_size)
+            pi = np.random.random_sample([batch_size, env.action_size])
+            z = np.random.random_sample([batch_size])
+            operations = [('forward', lambda: net(states)),
+                          ('train', lambda: net.train(states, pi, z))]
+            for operation, function in operations:
+                # one warm up call so graph setup isn't timed
+                function()
+                result = time_function(function, n_calls, n_repeats)
+                result['name'] = 'net/kqk/{}/batch_{}'.format(operation, batch_size)
+                result['batch_size'] = batch_size
+                result['positions_per_second'] = batch_size / result['seconds_per_call']
+                results.append(result)
+        sess.close()
+    return results
+
+
+def session_benchmarks(batch_sizes, n_calls, n_repeats, num_convolutional_filters, n_residual_layers,
+                       thread_settings):
+    """
+    Times inference-only DualNet forward passes for every batch size under each session
+    thread setting, giving a batch size vs latency curve per setting.
+    """
+    import tensorflow as tf
+    from dual_net import DualNet, make_session
+
+    env = KQKChessEnv('KQK_conv', 'KQK_pos_pos')
+    results = []
+    for intra_op_threads, inter_op_threads in thread_settings:
+        with tf.Graph().as_default() as graph:
+            sess = make_session(intra_op_threads, inter_op_threads, graph=graph)
+            net = DualNet(sess, env,
+                          num_convolutional_filters=num_convolutional_filters,
+                          n_residual_layers=n_residual_layers,
+                          inference_only=True)
+            sess.run(tf.global_variables_initializer())
+            for batch_size in batch_sizes:
+                states = np.array([kqk_start_state()] * batch_size)
+                net(states)
+                result = time_function(lambda: net(states), n_calls, n_repeats)
+                result['name'] = 'session/intra_{}_inter_{}/batch_{}'.format(intra_op_threads, inter_op_threads,
+                                                                            batch_size)
+                result['intra_op_threads'] = intra_op_threads
+                result['inter_op_threads'] = inter_op_threads
+                result['batch_size'] = batch_size
+                result['latency_ms'] = result['seconds_per_call'] * 1000
+                result['positions_per_second'] = batch_size / result['seconds_per_call']
+                results.append(result)
+            sess.close()
+    return results
+
+
+def run_benchmarks(sections=SECTIONS,
+                   n_calls=200,
+                   n_repeats=3,
+                   n_leaf_expansions=200,
+                   batch_sizes=DEFAULT_BATCH_SIZES,
+                   net_calls=10,
+                   num_convolutional_filters=64,
+                   n_residual_layers=2,
+                   thread_settings=DEFAULT_THREAD_SETTINGS):
+    """
+    Runs the requested benchmark sections and returns a dict that can be dumped as JSON.
+    A section whose dependencies can't be imported is reported under 'skipped' instead
+    of failing the whole run.
+    """
+    np.random.seed(0)
+    report = {'metadata': {'timestamp': time.time(),
+                           'python': platform.python_version(),
+                           'numpy': np.__version__,
+                           'platform': platform.platform(),
+                           'sections': list(sections)},
+              'results': [],
+              'skipped': {}}
+    for section in sections:
+        try:
+            if section == 'env':
+                report['results'] += env_benchmarks(n_calls, n_repeats)
+            elif section == 'mcts':
+                report['results'] += mcts_benchmarks(n_leaf_expansions, n_repeats)
+            elif section == 'net':
+                report['results'] += net_benchmarks(batch_sizes, net_calls, n_repeats,
+                                                    num_convolutional_filters, n_residual_layers)
+            elif section == 'session':
+                report['results'] += session_benchmarks(batch_sizes, net_calls, n_repeats,
+                                                        num_convolutional_filters, n_residual_layers,
+                                                        thread_settings)
+            else:
+                raise ValueError('Unknown benchmark section {}'.format(section))
+        except ImportError as e:
+            report['skipped'][section] = str(e)
+    return report
+
+
+def parse_thread_setting(text):
+    intra_op_threads, inter_op_threads = text.split(',')
+    return int(intra_op_threads), int(inter_op_threads)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument('--output', help='file to write the JSON results to, printed if not given')
+    parser.add_argument('--calls', type=int, default=200, help='calls per repeat for env operations')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--leaf-expansions', type=int, default=200, help='rollouts per MCTS benchmark')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument('--net-calls', type=int, default=10, help='calls per repeat for DualNet operations')
+    parser.add_argument('--filters', type=int, default=64, help='convolutional filters in the benchmarked DualNet')
+    parser.add_argument('--residual-layers', type=int, default=2)
+    parser.add_argument('--thread-settings', nargs='+', type=parse_thread_setting,
+                        default=list(DEFAULT_THREAD_SETTINGS),
+                        help='intra_op_threads,inter_op_threads pairs for the session section')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(sections=args.sections,
+                            n_calls=args.calls,
+                            n_repeats=args.repeats,
+                            n_leaf_expansions=args.leaf_expansions,
+                            batch_sizes=args.batch_sizes,
+                            net_calls=args.net_calls,
+                            num_convolutional_filters=args.filters,
+                            n_residual_layers=args.residual_layers,
+                            thread_settings=args.thread_settings)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,8 @@ import os
 
 import numpy as np
 import chess
-import chess.uci
+
+from zobrist import ZobristTable
 
 PATH_TO_STOCKFISH_EXE = os.path.expanduser('~/stockfish-8-mac/Mac/stockfish-8-64')
 
@@ -22,7 +23,13 @@ CHAR_TO_INDEX_MAP = {'K': 0, 'k': 6,
                      'P': 5, 'p': 11}
 
 FULL_CHESS_INPUT_SHAPE = (8, 8, 13)
+# states are one-hot planes, stored compactly and converted to floats by the model
+STATE_DTYPE = np.uint8
 PIECE_POSITION_ACTION_SIZE = 32 * 64
+TURN_PLANE = 12
+# planes of the pieces that castle
+WHITE_KING_PLANE, BLACK_KING_PLANE = 0, 6
+ROOK_PLANE_OFFSET = 2
 POSITION_POSITION_ACTION_SIZE = 64 * 64
 
 
@@ -34,6 +41,35 @@ def map_square_to_xy(square):
     return int(square % 8), int(square // 8)
 
 
+def apply_move(env, state, action, turn_plane, state_hash=None):
+    """
+    Returns a tuple of (next_state, next_hash) for taking action in state.  The entries of
+    env.move_changes and the side to move plane are flipped in a copy of state, rather than
+    going through a chess.Board.
+
+    Parameters
+    ----------
+    env: ChessEnv or KQKChessEnv
+        env whose move_changes, zobrist and side_to_move_key are used
+    state: np.ndarray
+        state the action is taken in
+    action: int
+        index of the action in env's action space
+    turn_plane: int
+        plane of the state recording the side to move
+    state_hash: int
+        Zobrist hash of state, updated with the same flips.  next_hash is None if not given.
+    """
+    next_state = state.copy()
+    next_hash = None if state_hash is None else state_hash ^ env.side_to_move_key
+    for index in env.move_changes(state, action):
+        next_state[index] = 1 - next_state[index]
+        if next_hash is not None:
+            next_hash = env.zobrist.toggle(next_hash, index)
+    next_state[:, :, turn_plane] = 1 - next_state[:, :, turn_plane]
+    return next_state, next_hash
+
+
 class ChessEnv(object):
     """
     The full chess environment.
@@ -41,6 +77,9 @@ class ChessEnv(object):
     def __init__(self, input_shape=FULL_CHESS_INPUT_SHAPE, action_size=POSITION_POSITION_ACTION_SIZE):
         self.action_size = action_size
         self.input_shape = input_shape
+        self.state_dtype = STATE_DTYPE
+        self.zobrist = ZobristTable(input_shape)
+        self.side_to_move_key = self.zobrist.plane_key(TURN_PLANE)
 
     def reset(self):
         board = chess.Board()
@@ -48,26 +87,72 @@ class ChessEnv(object):
         return state
 
     def get_next_state(self, state, action):
-        board = self.map_state_to_board(state)
-        move = self.map_action_to_move(state, action)
-        board.push(move)
-        next_state = self.map_board_to_state(board)
-        return next_state
+        """
+        Returns the state after taking action.  Only the squares the move changes are updated
+        in a copy of state, see apply_move.
+        """
+        return apply_move(self, state, action, TURN_PLANE)[0]
+
+    def move_changes(self, state, action):
+        """
+        Returns the list of (row, col, plane) entries of state that flip when action is taken,
+        not counting the side to move.  These are the moving piece leaving its square and
+        arriving on the next, a captured piece and, when castling, the rook.
+
+        The results match pushing the move on the board from map_state_to_board.  States don't
+        record en passant squares, so there are no en passant captures, and actions don't
+        record promotions, so a pawn reaching the last rank stays a pawn.
+        """
+        from_square, to_square = divmod(int(action), 64)
+        from_row, from_col = 7 - from_square // 8, from_square % 8
+        to_row, to_col = 7 - to_square // 8, to_square % 8
+        moving_plane = int(np.flatnonzero(state[from_row, from_col, :TURN_PLANE])[0])
+        changes = [(from_row, from_col, moving_plane), (to_row, to_col, moving_plane)]
+        captured_planes = np.flatnonzero(state[to_row, to_col, :TURN_PLANE])
+        if captured_planes.size:
+            changes.append((to_row, to_col, int(captured_planes[0])))
+
+        # a king moving two files from its starting square castles, taking the rook over it
+        if moving_plane in (WHITE_KING_PLANE, BLACK_KING_PLANE) and from_col == 4 and abs(to_col - from_col) == 2:
+            rook_plane = moving_plane + ROOK_PLANE_OFFSET
+            rook_from_col = 7 if to_col > from_col else 0
+            if state[from_row, rook_from_col, rook_plane]:
+                rook_to_col = (from_col + to_col) // 2
+                changes += [(from_row, rook_from_col, rook_plane), (from_row, rook_to_col, rook_plane)]
+        return changes
+
+    def hash_state(self, state):
+        """
+        Returns the 64 bit Zobrist hash of state as an int
+        """
+        return self.zobrist.hash_state(state)
+
+    def hash_states(self, states):
+        """
+        Returns a uint64 array of the Zobrist hashes of a batch of states
+        """
+        return self.zobrist.hash_states(states)
+
+    def get_next_state_with_hash(self, state, state_hash, action):
+        """
+        Returns a tuple of (next_state, next_hash), the state after taking action and its hash
+        updated from state_hash, the hash of state, with only the entries the move changes
+        """
+        return apply_move(self, state, action, TURN_PLANE, state_hash)
+
+    def _indexable_moves(self, board):
+        # actions don't record promotions, so a pawn reaching the last rank has one action for
+        # its four promotions.  Only the queen promotion is kept, or the action would repeat.
+        return [move for move in board.legal_moves if move.promotion in (None, chess.QUEEN)]
 
     def get_legal_actions(self, state):
         board = self.map_state_to_board(state)
-        legal_moves = board.legal_moves
-        legal_actions = np.zeros(len(legal_moves), dtype=int)
-        i = 0
-        for move in legal_moves:
-            action = self.map_move_to_action(board, move)
-            legal_actions[i] = action
-            i += 1
-        return legal_actions
+        legal_actions = [self.move_to_index(board, move) for move in self._indexable_moves(board)]
+        return np.array(legal_actions, dtype=int)
 
     def get_legality_mask(self, state):
         board = self.map_state_to_board(state)
-        legal_moves = board.legal_moves
+        legal_moves = self._indexable_moves(board)
         legal_moves_as_indices = [self.move_to_index(board, move) for move in legal_moves]
         move_legality_mask = np.zeros(self.action_size)
         for index in legal_moves_as_indices:
@@ -110,7 +195,7 @@ class ChessEnv(object):
         """
         board_string = str(board)
         rows = board_string.split('\n')
-        state = np.zeros(shape=(8, 8, 13))
+        state = np.zeros(shape=(8, 8, 13), dtype=STATE_DTYPE)
         for i in range(8):
             row = rows[i]
             pieces = row.split(' ')
@@ -120,7 +205,7 @@ class ChessEnv(object):
                     continue
                 state[i][j][CHAR_TO_INDEX_MAP[char]] = 1
         if board.turn:
-            state[:, :, 12] = np.ones(shape=(8, 8))
+            state[:, :, 12] = 1
         return state
 
     def map_state_to_board(self, state):
@@ -152,10 +237,9 @@ class ChessEnv(object):
         board.turn = int(state[0, 0, 12])
         return board
 
-    def map_action_to_move(self, action):
-        index = np.where(action == 1)[0][0]
-        from_pos = int(index / 64)
-        to_pos = index % 64
+    def map_action_to_move(self, state, action):
+        from_pos = int(action // 64)
+        to_pos = int(action % 64)
         return chess.Move(from_pos, to_pos)
 
     def map_move_to_action(self, board, move):
@@ -206,6 +290,9 @@ def score(board, movetime=1000, engine_path=PATH_TO_STOCKFISH_EXE):
     >>> score(board)
     0.17
     """
+    # the engine bindings are only needed here, so don't make every import of the env pay for them
+    import chess.uci
+
     handler = chess.uci.InfoHandler()
     engine = chess.uci.popen_engine(engine_path)
 
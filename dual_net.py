@@ -1,11 +1,71 @@
-import tensorflow as tf
-import tensorflow.contrib.layers as layers
+import contextlib
+import threading
 
 import numpy as np
-import chess
 
-from chess_env import FULL_CHESS_INPUT_SHAPE
+import tracing
 
+# TensorFlow takes seconds to import, so it is only loaded once a net is built.  Processes that
+# only play with the envs and the search never import it.
+tf = None
+layers = None
+
+
+def _import_tensorflow():
+    global tf, layers
+    if tf is None:
+        import tensorflow
+        import tensorflow.contrib.layers
+        tf = tensorflow
+        layers = tensorflow.contrib.layers
+
+
+class ReadWriteLock(object):
+    """
+    A lock held shared by any number of readers or exclusively by one writer.  Writers
+    waiting for the lock keep new readers out, so a steady stream of readers can't starve
+    them.
+    """
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._n_readers = 0
+        self._n_waiting_writers = 0
+        self._writing = False
+
+    @contextlib.contextmanager
+    def shared(self):
+        with self._condition:
+            while self._writing or self._n_waiting_writers:
+                self._condition.wait()
+            self._n_readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._n_readers -= 1
+                if not self._n_readers:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._n_waiting_writers += 1
+            try:
+                while self._writing or self._n_readers:
+                    self._condition.wait()
+            finally:
+                self._n_waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+# Convolutions feeding a batch normalization have no biases, the normalization's offset plays that
+# role.  Keeping the convolution and the normalization adjacent lets export_frozen_graph fold them.
 
 # A convolutional block as described in AlphaGo Zero
 def conv_block(tensor, specs):
@@ -13,7 +73,8 @@ def conv_block(tensor, specs):
                                   num_outputs=specs['num_outputs'],
                                   kernel_size=specs['kernel_size'],
                                   stride=specs['stride'],
-                                  activation_fn=None)
+                                  activation_fn=None,
+                                  biases_initializer=None)
     tensor = tf.layers.batch_normalization(tensor)
     tensor = tf.nn.relu(tensor)
     return tensor
@@ -27,7 +88,8 @@ def residual_block(tensor, specs):
                                   num_outputs=specs['num_outputs'],
                                   kernel_size=specs['kernel_size'],
                                   stride=specs['stride'],
-                                  activation_fn=None)
+                                  activation_fn=None,
+                                  biases_initializer=None)
     tensor = tf.layers.batch_normalization(tensor)
     tensor += input_tensor
     tensor = tf.nn.relu(tensor)
@@ -39,7 +101,8 @@ def build_model(board_placeholder,
                 scope,
                 shared_layers,
                 policy_head,
-                value_head):
+                value_head,
+                legal_move_indices_placeholder=None):
     """
     Returns the output tensors for an model based on the layers in shared_layers,
     policy_head, and value_head.
@@ -58,8 +121,49 @@ def build_model(board_placeholder,
     policy_head and value_head have the same structure as above but represent
     the layers for the policy head and value head, respectively.
 
-    returns the policy output and the value output in a tuple
+    legal_move_indices_placeholder is an optional int32 tensor of (row, action) pairs
+    listing the legal actions of every board in the batch, see legal_move_softmax.
+
+    returns the policy output and the value output in a tuple, followed by
+    the priors of the legal moves if legal_move_indices_placeholder is given
+    """
+    _import_tensorflow()
+    # boards are fed in the envs' compact dtype and only become floats here
+    board_placeholder = tf.cast(board_placeholder, tf.float32)
+    with tf.variable_scope(scope):
+        policy_logits, value_out = _build_layers(board_placeholder, shared_layers, policy_head, value_head)
+
+    # subtracting each row's largest legal logit keeps exp from overflowing, as in legal_move_softmax
+    legal_logits = tf.where(legality_mask_placeholder > 0, policy_logits,
+                            tf.fill(tf.shape(policy_logits), np.float32(-np.inf)))
+    row_max = tf.reduce_max(legal_logits, axis=1, keepdims=True)
+    row_max = tf.where(tf.is_finite(row_max), row_max, tf.zeros_like(row_max))
+    # illegal logits are -inf here, so they can't overflow either and come out as exactly 0
+    x = tf.exp(legal_logits - tf.stop_gradient(row_max)) * legality_mask_placeholder
+    # Needs reshape to broadcast properly
+    policy_out = x / tf.reshape(tf.reduce_sum(x, axis=1), shape=((tf.shape(x)[0],) + (1,)))
+    if legal_move_indices_placeholder is None:
+        return policy_out, value_out
+    return policy_out, value_out, legal_move_softmax(policy_logits, legal_move_indices_placeholder)
+
+
+def legal_move_softmax(policy_logits, legal_move_indices):
+    """
+    Returns the softmax of policy_logits taken over the legal moves of each row only.
+    legal_move_indices is a [n_legal_moves, 2] int32 tensor of (row, action) pairs, grouped
+    by row, and the result holds the prior of each pair in the same order.
     """
+    rows = legal_move_indices[:, 0]
+    n_rows = tf.shape(policy_logits)[0]
+    legal_logits = tf.gather_nd(policy_logits, legal_move_indices)
+    # subtracting each row's largest logit keeps exp from overflowing without changing the result
+    row_max = tf.unsorted_segment_max(legal_logits, rows, n_rows)
+    exp_logits = tf.exp(legal_logits - tf.gather(row_max, rows))
+    row_sums = tf.unsorted_segment_sum(exp_logits, rows, n_rows)
+    return exp_logits / tf.gather(row_sums, rows)
+
+
+def _build_layers(board_placeholder, shared_layers, policy_head, value_head):
     out = board_placeholder
     for specs in shared_layers:
         if specs['layer'] == 'conv':
@@ -82,10 +186,6 @@ def build_model(board_placeholder,
                                                 num_outputs=specs['num_outputs'],
                                                 activation_fn=specs['activation_fn'])
 
-    x = tf.exp(policy_out) * legality_mask_placeholder
-    # Needs reshape to broadcast properly
-    policy_out = x / tf.reshape(tf.reduce_sum(x, axis=1), shape=((tf.shape(x)[0],) + (1,)))
-
     # Value head
     value_out = out
     for specs in value_head:
@@ -96,7 +196,65 @@ def build_model(board_placeholder,
             value_out = layers.fully_connected(value_out,
                                                num_outputs=specs['num_outputs'],
                                                activation_fn=specs['activation_fn'])
-    return policy_out, value_out
+    return policy_out, tf.cast(value_out, tf.float32)
+
+
+def make_session(intra_op_threads=0, inter_op_threads=0, use_gpu=True, graph=None, log_device_placement=False):
+    """
+    Returns a tf.Session configured for running DualNets.
+
+    Parameters
+    ----------
+    intra_op_threads: int
+        threads a single op, such as a convolution, may use.  0 lets TensorFlow pick,
+        which is one per core.  Processes sharing a host should split the cores between them.
+    inter_op_threads: int
+        independent ops that may run at once.  0 lets TensorFlow pick.
+    use_gpu: boolean
+        If set to False, hide any GPU so every op runs on the CPU
+    graph: tf.Graph
+        graph for the session, the default graph if not given.  Nets built in the same graph
+        can share the session.
+    log_device_placement: boolean
+        If set to True, log which device every op is placed on
+    """
+    _import_tensorflow()
+    config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                            inter_op_parallelism_threads=inter_op_threads,
+                            allow_soft_placement=True,
+                            log_device_placement=log_device_placement)
+    if not use_gpu:
+        config.device_count['GPU'] = 0
+    return tf.Session(graph=graph, config=config)
+
+
+def legal_move_indices(legal_actions):
+    """
+    Returns the [n_legal_moves, 2] int32 array of (row, action) pairs for a list holding the
+    legal actions of each state in a batch
+    """
+    rows = [np.full(len(actions), i, dtype=np.int32) for i, actions in enumerate(legal_actions)]
+    if not rows:
+        return np.zeros((0, 2), dtype=np.int32)
+    return np.stack([np.concatenate(rows),
+                     np.concatenate([np.asarray(actions, dtype=np.int32) for actions in legal_actions])], axis=1)
+
+
+def split_legal_priors(legal_priors, legal_actions):
+    """
+    Splits the flat priors returned for legal_move_indices(legal_actions) into one array per state
+    """
+    return np.split(legal_priors, np.cumsum([len(actions) for actions in legal_actions])[:-1])
+
+
+def legality_masks(env, states, action_size):
+    """
+    Returns an array with the env's legality mask for each of states
+    """
+    masks = np.zeros(shape=(len(states), action_size), dtype=np.float32)
+    for i in range(len(states)):
+        masks[i] = env.get_legality_mask(states[i])
+    return masks
 
 
 class DualNet(object):
@@ -109,7 +267,10 @@ class DualNet(object):
                  n_residual_layers=2,
                  #input_shape=FULL_CHESS_INPUT_SHAPE,
                  #action_size=POSITION_POSITION_ACTION_SIZE,
-                 num_convolutional_filters=256
+                 num_convolutional_filters=256,
+                 inference_only=False,
+                 scope=None,
+                 device=None
                  ):
         """
         sess: tensorflow session
@@ -120,10 +281,19 @@ class DualNet(object):
                            AlphaGo Zero.
         num_convolutional_filters: how many convolutional filters to have in
                                    each convolutional layer
+        inference_only: if True, only build the forward pass.  The net can't be
+                        trained, but it builds faster and takes less memory,
+                        which suits self-play workers.
+        scope: name of the variable scope holding the net's variables, a
+               unique 'dual_net' scope if not given
+        device: optional device to place the net on, such as '/cpu:0' or
+                '/gpu:1'.  Several nets can share a graph and a session
+                made with make_session, each under its own scope.
         """
+        _import_tensorflow()
         self.action_size = env.action_size
-        self.board_placeholder = tf.placeholder(tf.float32, [None] + list(env.input_shape))
         self.env = env
+        self.inference_only = inference_only
 
         shared_layers = [{'layer': 'conv', 'num_outputs':
                           num_convolutional_filters, 'stride': 3,
@@ -146,13 +316,37 @@ class DualNet(object):
                          'activation_fn': tf.nn.tanh}]
 
         self.boards = None
-        self.move_legality_mask = tf.placeholder(tf.float32, [None, self.action_size])
-        self.policy_predict, self.value_predict = build_model(self.board_placeholder,
-                                                              self.move_legality_mask,
-                                                              scope='net',
-                                                              shared_layers=shared_layers,
-                                                              policy_head=policy_layers,
-                                                              value_head=value_layers)
+        # an empty ExitStack leaves any device set by the caller in place
+        device_scope = tf.device(device) if device is not None else contextlib.ExitStack()
+        with device_scope, tf.variable_scope(scope, default_name='dual_net') as net_scope:
+            self.scope = net_scope.name
+            # one-hot planes are fed as uint8, an eighth of the bytes of float64 states
+            self.board_placeholder = tf.placeholder(tf.uint8, [None] + list(env.input_shape), name='boards')
+            self.move_legality_mask = tf.placeholder(tf.float32, [None, self.action_size], name='legality_mask')
+            self.legal_move_indices = tf.placeholder(tf.int32, [None, 2], name='legal_move_indices')
+            policy_predict, value_predict, legal_policy_predict = build_model(
+                self.board_placeholder,
+                self.move_legality_mask,
+                scope='net',
+                shared_layers=shared_layers,
+                policy_head=policy_layers,
+                value_head=value_layers,
+                legal_move_indices_placeholder=self.legal_move_indices)
+            # named so the outputs can be found again in an exported graph
+            self.policy_predict = tf.identity(policy_predict, name='policy')
+            self.value_predict = tf.identity(value_predict, name='value')
+            self.legal_policy_predict = tf.identity(legal_policy_predict, name='legal_policy')
+            if not inference_only:
+                self._build_training_ops(learning_rate, regularization_mult)
+        self.sess = sess
+        # held shared around forward passes, which may run concurrently, and exclusively
+        # around anything that writes the variables, so weights only change between batches
+        self._lock = ReadWriteLock()
+        self._saver = None
+        self._assign_placeholders = None
+        self._assign_op = None
+
+    def _build_training_ops(self, learning_rate, regularization_mult):
         self.z = tf.placeholder(tf.float32, [None])
         # Reshape z for proper broadcasting
         reshaped_z = tf.reshape(self.z, [tf.shape(self.z)[0], 1])
@@ -165,24 +359,55 @@ class DualNet(object):
         self.policy_loss = tf.reduce_sum(tf.multiply(self.pi, tf.log(self.policy_predict + 0.0001)))
 
         self.regularization_loss = layers.apply_regularization(layers.l2_regularizer(regularization_mult),
-                                                               weights_list=tf.trainable_variables())
+                                                               weights_list=self.trainable_variables())
         self.loss = self.value_loss - self.policy_loss + tf.reduce_sum(self.regularization_loss)
-        self.update_op = tf.train.AdamOptimizer(learning_rate).minimize(self.loss)
-        self.sess = sess
+        self.update_op = tf.train.AdamOptimizer(learning_rate).minimize(self.loss,
+                                                                        var_list=self.trainable_variables())
+
+    def trainable_variables(self):
+        """
+        Returns the trainable variables of this net, leaving out those of other nets in the graph
+        """
+        return tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=self.scope + '/')
+
+    def model_variables(self):
+        """
+        Returns the variables the forward pass depends on, including the batch normalization
+        statistics but not the optimizer's state
+        """
+        return tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope=self.scope + '/net/')
+
+    def _relative_name(self, variable):
+        # names without the net's scope, so weights move between nets built under different scopes
+        return variable.op.name[len(self.scope) + 1:]
 
     def __call__(self, inp):
         """
         Gets a feed-forward prediction for a batch of input boards of shape set
         during initialization.
         """
-        move_legality_mask = np.zeros(shape=(inp.shape[0], self.action_size))
-        for i in range(inp.shape[0]):
-            move_legality_mask[i] = self.env.get_legality_mask(inp[i])
-        policy, value = self.sess.run([self.policy_predict, self.value_predict],
-                                      feed_dict={self.board_placeholder: inp,
-                                                 self.move_legality_mask: move_legality_mask})
+        move_legality_mask = legality_masks(self.env, inp, self.action_size)
+        with tracing.span('dual_net_forward', 'model', batch_size=inp.shape[0]), self._lock.shared():
+            policy, value = self.sess.run([self.policy_predict, self.value_predict],
+                                          feed_dict={self.board_placeholder: inp,
+                                                     self.move_legality_mask: move_legality_mask})
         return policy, value
 
+    def predict_legal(self, states, legal_actions=None):
+        """
+        Returns a tuple of (priors, values) for a batch of states, where priors holds an
+        array for every state with the probabilities of its legal actions, in the order of
+        legal_actions.  Only the legal moves are fed and fetched, not dense masks and policies
+        over the whole action space.  legal_actions is taken from the env if not given.
+        """
+        if legal_actions is None:
+            legal_actions = [self.env.get_legal_actions(state) for state in states]
+        with tracing.span('dual_net_predict_legal', 'model', batch_size=len(states)), self._lock.shared():
+            legal_priors, values = self.sess.run([self.legal_policy_predict, self.value_predict],
+                                                 feed_dict={self.board_placeholder: states,
+                                                            self.legal_move_indices: legal_move_indices(legal_actions)})
+        return split_legal_priors(legal_priors, legal_actions), values
+
     def train(self, states, pi, z, token_legality_mask=None):
         """
         Performs one step of gradient descent based on a batch of input boards,
@@ -193,15 +418,234 @@ class DualNet(object):
         The token_legality_mask is just for test purposes so we can input a mask of our choosing
         Otherwise, it gets the legality_mask from the environment
         """
+        if self.inference_only:
+            raise ValueError('Can not train a DualNet built with inference_only=True')
         if token_legality_mask is None:
-          move_legality_mask = np.zeros(shape=(len(states), self.action_size))
-          for i in range(len(states)):
-              move_legality_mask[i] = self.env.get_legality_mask(states[i])
+          move_legality_mask = legality_masks(self.env, states, self.action_size)
         else:
           move_legality_mask = token_legality_mask
-        _, loss = self.sess.run([self.update_op, self.loss], feed_dict={self.board_placeholder: states,
-                                                   self.pi: pi,
-                                                   self.z: z,
-                                                   self.move_legality_mask: move_legality_mask})
+        with tracing.span('dual_net_train', 'train', batch_size=len(states)), self._lock.exclusive():
+            _, loss = self.sess.run([self.update_op, self.loss], feed_dict={self.board_placeholder: states,
+                                                       self.pi: pi,
+                                                       self.z: z,
+                                                       self.move_legality_mask: move_legality_mask})
 
         return loss
+
+    def _get_saver(self):
+        # built under the exclusive lock, readers holding the shared one may be saving at the same time
+        with self._lock.exclusive():
+            if self._saver is None:
+                variables = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope=self.scope + '/')
+                with self.sess.graph.as_default():
+                    self._saver = tf.train.Saver({self._relative_name(v): v for v in variables}, max_to_keep=None)
+        return self._saver
+
+    def save(self, path):
+        """
+        Writes a checkpoint of the net's variables, optimizer state included, to path and
+        returns the path written.  No meta graph is written, the graph is rebuilt by code.
+        """
+        saver = self._get_saver()
+        with self._lock.shared():
+            return saver.save(self.sess, path, write_meta_graph=False)
+
+    def restore(self, path):
+        """
+        Loads a checkpoint written by save into the running session.  An inference_only net
+        restores the forward pass weights from a checkpoint of a net that was trained.
+        """
+        saver = self._get_saver()
+        with self._lock.exclusive():
+            saver.restore(self.sess, path)
+
+    def get_weights(self):
+        """
+        Returns a dict from variable name to value for the variables of the forward pass
+        """
+        variables = self.model_variables()
+        with self._lock.shared():
+            values = self.sess.run(variables)
+        return {self._relative_name(variable): value for variable, value in zip(variables, values)}
+
+    def set_weights(self, weights):
+        """
+        Replaces the forward pass weights of the running net with weights, a dict as returned
+        by get_weights, without rebuilding the graph.  Batches already being evaluated finish
+        with the old weights.
+        """
+        if self._assign_op is None:
+            self._build_assign_ops()
+        feed_dict = {placeholder: weights[name] for name, placeholder in self._assign_placeholders.items()
+                     if name in weights}
+        if len(feed_dict) != len(self._assign_placeholders):
+            missing = sorted(set(self._assign_placeholders) - set(weights))
+            raise ValueError('Weights are missing for {}'.format(missing))
+        with self._lock.exclusive():
+            self.sess.run(self._assign_op, feed_dict=feed_dict)
+
+    def _build_assign_ops(self):
+        # built once so later swaps only feed new values instead of growing the graph
+        self._assign_placeholders = {}
+        assign_ops = []
+        with self.sess.graph.as_default(), tf.name_scope(self.scope + '/assign/'):
+            for variable in self.model_variables():
+                placeholder = tf.placeholder(variable.dtype.base_dtype, variable.shape)
+                self._assign_placeholders[self._relative_name(variable)] = placeholder
+                assign_ops.append(tf.assign(variable, placeholder))
+            self._assign_op = tf.group(*assign_ops)
+
+    def export_frozen_graph(self, path):
+        """
+        Writes the forward pass with the current weights baked in as constants to path, with
+        the batch normalizations folded into the convolutions before them.  Load it with
+        FrozenDualNet.
+        """
+        from tensorflow.tools.graph_transforms import TransformGraph
+
+        output_names = [self.policy_predict.op.name, self.value_predict.op.name, self.legal_policy_predict.op.name]
+        input_names = [self.board_placeholder.op.name, self.move_legality_mask.op.name,
+                       self.legal_move_indices.op.name]
+        with self._lock.shared():
+            graph_def = tf.graph_util.convert_variables_to_constants(self.sess,
+                                                                     self.sess.graph.as_graph_def(),
+                                                                     output_names)
+        graph_def = TransformGraph(graph_def, input_names, output_names,
+                                   ['strip_unused_nodes',
+                                    'fold_constants(ignore_errors=true)'])
+        graph_def = fold_batch_norms(graph_def, output_names)
+        with tf.gfile.GFile(path, 'wb') as f:
+            f.write(graph_def.SerializeToString())
+
+
+def _constant_value(nodes, name):
+    # the value of the Const a tensor name refers to, looking through Identity ops
+    node = nodes[name.split(':')[0]]
+    while node.op == 'Identity':
+        node = nodes[node.input[0].split(':')[0]]
+    if node.op != 'Const':
+        return None
+    return tf.make_ndarray(node.attr['value'].tensor)
+
+
+def fold_batch_norms(graph_def, output_names):
+    """
+    Returns a copy of a frozen graph_def, trimmed to what output_names need, where every
+    inference mode batch normalization that directly follows a convolution is folded into
+    the convolution's weights and a bias add.
+    The graph transform tool's fold_old_batch_norms doesn't recognize FusedBatchNormV3, which
+    is what the batch normalizations are built as, so they are folded here instead.
+    """
+    nodes = {node.name: node for node in graph_def.node}
+    consumers = {}
+    for node in graph_def.node:
+        for name in node.input:
+            consumers.setdefault(name.split(':')[0].lstrip('^'), []).append(node.name)
+
+    folded = {}
+    for node in graph_def.node:
+        if node.op not in ('FusedBatchNorm', 'FusedBatchNormV3') or node.attr['is_training'].b:
+            continue
+        conv = nodes[node.input[0].split(':')[0]]
+        if (conv.op != 'Conv2D' or conv.attr['data_format'].s != b'NHWC'
+                or consumers.get(conv.name) != [node.name]):
+            continue
+        weights = _constant_value(nodes, conv.input[1])
+        gamma, beta, mean, variance = [_constant_value(nodes, name) for name in node.input[1:5]]
+        if any(value is None for value in (weights, gamma, beta, mean, variance)):
+            continue
+        scale = gamma / np.sqrt(variance + node.attr['epsilon'].f)
+        folded[conv.name] = (weights * scale).astype(weights.dtype)
+        folded[node.name] = (beta - mean * scale).astype(weights.dtype)
+
+    output = tf.GraphDef()
+    output.versions.CopyFrom(graph_def.versions)
+    output.library.CopyFrom(graph_def.library)
+    for node in graph_def.node:
+        new_node = output.node.add()
+        new_node.CopyFrom(node)
+        if node.name not in folded:
+            continue
+        constant = output.node.add()
+        constant.op = 'Const'
+        constant.attr['dtype'].type = node.attr['T'].type
+        constant.attr['value'].tensor.CopyFrom(tf.make_tensor_proto(folded[node.name]))
+        if node.op == 'Conv2D':
+            constant.name = node.name + '/folded_weights'
+            new_node.input[1] = constant.name
+        else:
+            # the bias add takes the batch normalization's name, so its consumers are unchanged
+            constant.name = node.name + '/folded_bias'
+            new_node.ClearField('input')
+            new_node.ClearField('attr')
+            new_node.op = 'BiasAdd'
+            new_node.input.extend([node.input[0], constant.name])
+            new_node.attr['T'].type = node.attr['T'].type
+            new_node.attr['data_format'].s = b'NHWC'
+    # drops the batch normalizations' parameters and the original weights, no longer used
+    return tf.graph_util.extract_sub_graph(output, output_names)
+
+
+class FrozenDualNet(object):
+    """
+    Inference-only DualNet loaded from a graph written by DualNet.export_frozen_graph.  It
+    holds no variables, so it is ready as soon as the file is read, and it runs in its own
+    graph and session.
+
+    Parameters
+    ----------
+    path: str
+        the exported graph
+    env:
+        environment to determine move legality with
+    config: tf.ConfigProto
+        optional configuration for the session
+    """
+    def __init__(self, path, env, config=None):
+        _import_tensorflow()
+        self.env = env
+        self.action_size = env.action_size
+
+        graph_def = tf.GraphDef()
+        with tf.gfile.GFile(path, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        # the exported graph holds a single net, whose scope is found from its boards placeholder
+        board_names = [node.name for node in graph_def.node
+                       if node.op == 'Placeholder' and node.name.split('/')[-1] == 'boards']
+        if len(board_names) != 1:
+            raise ValueError('{} does not hold a single exported DualNet'.format(path))
+        prefix = board_names[0][:-len('boards')]
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+        self.board_placeholder = self.graph.get_tensor_by_name(prefix + 'boards:0')
+        self.move_legality_mask = self.graph.get_tensor_by_name(prefix + 'legality_mask:0')
+        self.policy_predict = self.graph.get_tensor_by_name(prefix + 'policy:0')
+        self.value_predict = self.graph.get_tensor_by_name(prefix + 'value:0')
+        self.legal_move_indices = self.graph.get_tensor_by_name(prefix + 'legal_move_indices:0')
+        self.legal_policy_predict = self.graph.get_tensor_by_name(prefix + 'legal_policy:0')
+        self.sess = tf.Session(graph=self.graph, config=config)
+
+    def __call__(self, inp):
+        move_legality_mask = legality_masks(self.env, inp, self.action_size)
+        with tracing.span('frozen_dual_net_forward', 'model', batch_size=inp.shape[0]):
+            policy, value = self.sess.run([self.policy_predict, self.value_predict],
+                                          feed_dict={self.board_placeholder: inp,
+                                                     self.move_legality_mask: move_legality_mask})
+        return policy, value
+
+    def predict_legal(self, states, legal_actions=None):
+        """
+        Same as DualNet.predict_legal
+        """
+        if legal_actions is None:
+            legal_actions = [self.env.get_legal_actions(state) for state in states]
+        with tracing.span('frozen_dual_net_predict_legal', 'model', batch_size=len(states)):
+            legal_priors, values = self.sess.run([self.legal_policy_predict, self.value_predict],
+                                                 feed_dict={self.board_placeholder: states,
+                                                            self.legal_move_indices: legal_move_indices(legal_actions)})
+        return split_legal_priors(legal_priors, legal_actions), values
+
+    def close(self):
+        self.sess.close()
@@ -1,7 +1,8 @@
 import numpy as np
 
-from mcts import get_next_state_with_mcts
-from tree import Node
+from mcts import get_next_state_with_mcts, make_search_pool
+from tree import Node, NodePool
+import tracing
 
 
 def self_play_game(model,
@@ -11,7 +12,11 @@ def self_play_game(model,
                    c_puct=1.0,
                    temperature=1,
                    max_num_turns=40,
-                   verbose=False):
+                   verbose=False,
+                   node_pool=None,
+                   max_nodes=None,
+                   n_processes=1,
+                   callbacks=None):
     """
     Plays a game (defined by the env), where a model with MCTS action distribution improvement plays
     itself. Returns a tuple of (states, winner_vector, action_distributions)
@@ -39,9 +44,24 @@ def self_play_game(model,
         maximum number of turns to play out before stopping the game
     verbose: boolean
         If set to True, print the board state after each move
+    node_pool: NodePool
+        pool that nodes discarded after each move are recycled into.  A new pool is
+        used for the game if none is given.
+    max_nodes: int
+        optional cap on the size of the search tree.  Least visited subtrees are collapsed
+        to stay under it.
+    n_processes: int
+        If greater than 1, each move is picked by a root-parallel search across that many
+        processes, so model and env must be picklable.  One process pool is used for the
+        whole game.
+    callbacks: list
+        optional SearchCallbacks that observe the search for every move, for example a
+        tree_memory.TreeMemoryProfiler to follow how the tree grows over the game.
     """
     if start_state is None:
         start_state = env.reset()
+    if node_pool is None:
+        node_pool = NodePool()
     state = start_state
     cur_node = Node(state)
     # vector of states
@@ -49,17 +69,27 @@ def self_play_game(model,
     # vector of action distributions for each game state
     action_distributions = []
 
+    search_pool = make_search_pool(n_processes, model, env) if n_processes > 1 else None
     num_turns = 0
-    while not env.is_game_over(cur_node.state) and num_turns <= max_num_turns:
-        states.append(cur_node.state)
-        if verbose:
-            env.print_board(cur_node.state)
-
-        # we pass nodes in to keep work done in previous mcts rollouts.
-        cur_node, distribution = get_next_state_with_mcts(cur_node, temperature, n_leaf_expansions, model, env, c_puct)
-        action_distributions.append(distribution)
-
-        num_turns += 1
+    try:
+        while not env.is_game_over(cur_node.state) and num_turns <= max_num_turns:
+            states.append(cur_node.state)
+            if verbose:
+                env.print_board(cur_node.state)
+
+            # we pass nodes in to keep work done in previous mcts rollouts.
+            # the rest of the tree is released into the pool after each move to keep memory bounded
+            with tracing.span('self_play_move', 'game', turn=num_turns):
+                cur_node, distribution = get_next_state_with_mcts(cur_node, temperature, n_leaf_expansions, model,
+                                                                  env, c_puct, node_pool, max_nodes,
+                                                                  n_processes=n_processes, callbacks=callbacks,
+                                                                  pool=search_pool)
+            action_distributions.append(distribution)
+
+            num_turns += 1
+    finally:
+        if search_pool is not None:
+            search_pool.terminate()
 
     if verbose:
         env.print_board(cur_node.state)
@@ -153,3 +183,44 @@ class RandomModel(object):
             values.append(np.array([0]))  # all states have equal value
 
         return (np.array(action_probs), np.array(values))
+
+
+class BatchRandomModel(object):
+    """
+    Vectorized version of RandomModel.  For every state in a batch, samples one legal action
+    uniformly at random with a single numpy operation over the batch of legality masks.
+
+    Every call returns new arrays, and numpy Generators lock around their draws, so one model
+    can be shared by the threads of a threaded search.
+    """
+    def __init__(self, env, seed=None):
+        self.env = env
+        self.random_state = np.random.default_rng(seed)
+
+    def reseed(self, seed):
+        """
+        Restarts the model's random stream from seed, an int or np.random.SeedSequence.  Search
+        pool workers reseed their copy of the model, see mcts.make_search_pool.
+        """
+        self.random_state = np.random.default_rng(seed)
+
+    def __call__(self, states):
+        legality_masks = np.zeros((len(states), self.env.action_size))
+        for i, state in enumerate(states):
+            legality_masks[i] = self.env.get_legality_mask(state)
+        return self.sample(legality_masks)
+
+    def sample(self, legality_masks):
+        """
+        Returns a tuple of (action_probs, values) where each row of action_probs one hot encodes
+        a legal action drawn uniformly from the corresponding row of legality_masks.  Rows
+        without any legal action are all zeros.
+        """
+        n_states = len(legality_masks)
+        # keys are drawn from (0, 1] so that every legal action beats every illegal one
+        random_keys = 1.0 - self.random_state.random(np.shape(legality_masks))
+        choices = np.argmax(random_keys * legality_masks, axis=1)
+        rows = np.arange(n_states)
+        action_probs = np.zeros(np.shape(legality_masks))
+        action_probs[rows, choices] = legality_masks[rows, choices]
+        return action_probs, np.zeros((n_states, 1))  # all states have equal value
@@ -0,0 +1,196 @@
+"""
+Shared memory transport between self-play workers and a process that owns the model.
+
+A SlotRing is a block of shared memory split into slots, each with room for a batch of
+states and the policies and values computed for them.  Every worker owns one slot and
+calls a RemoteModel, which writes states into the slot in place and waits.  The
+InferenceServer gathers the states of every waiting slot into one batch, runs the model on
+it, and writes the results back into the slots.  Nothing is pickled or allocated per request.
+
+    ring = SlotRing(n_slots=4, input_shape=env.input_shape, action_size=env.action_size)
+    server = InferenceServer(model, ring)
+    server.start()
+    # in worker i, ring having been passed to it as a Process argument
+    self_play_game(RemoteModel(ring, i), env)
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+
+import numpy as np
+
+import tracing
+
+SLOT_IDLE = 0
+SLOT_READY = 1
+
+
+class SlotRing(object):
+    """
+    Preallocated request and result slots in shared memory.  Pass it to worker processes as
+    a Process argument, which reattaches to the same memory.
+
+    Parameters
+    ----------
+    n_slots: int
+        number of slots, one for each worker
+    input_shape: tuple
+        shape of a single state
+    action_size: int
+        length of a policy
+    slot_batch_size: int
+        most states a worker can send in one request
+    input_dtype:
+        dtype states are stored in, the envs' compact uint8 by default
+    """
+    def __init__(self, n_slots, input_shape, action_size, slot_batch_size=1, input_dtype=np.uint8,
+                 context=multiprocessing):
+        self.n_slots = n_slots
+        self.slot_batch_size = slot_batch_size
+        # (name, shape, dtype) of each array in the block, laid out one after the other
+        self.layout = [('inputs', (n_slots, slot_batch_size) + tuple(input_shape), np.dtype(input_dtype).str),
+                       ('policies', (n_slots, slot_batch_size, action_size), np.dtype(np.float32).str),
+                       ('values', (n_slots, slot_batch_size, 1), np.dtype(np.float32).str),
+                       ('batch_sizes', (n_slots,), np.dtype(np.int32).str),
+                       ('status', (n_slots,), np.dtype(np.int32).str)]
+        size = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, shape, dtype in self.layout)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        # released once for every request, so the server sleeps while there is nothing to do
+        self.requests = context.Semaphore(0)
+        # released by the server when a slot's results are ready
+        self.done = [context.Semaphore(0) for _ in range(n_slots)]
+        self._attach()
+        self.status[:] = SLOT_IDLE
+
+    def _attach(self):
+        offset = 0
+        for name, shape, dtype in self.layout:
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+            setattr(self, name, array)
+            offset += array.nbytes
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name, _, _ in self.layout:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def close(self):
+        for name, _, _ in self.layout:
+            delattr(self, name)
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class RemoteModel(object):
+    """
+    A model that is evaluated by an InferenceServer.  Called like any model, it writes the
+    states into its slot of ring and blocks until the server has filled in the results.
+
+    The returned arrays are views of the slot, valid until the next call.
+    """
+    def __init__(self, ring, slot):
+        self.ring = ring
+        self.slot = slot
+
+    def __call__(self, states):
+        n_states = len(states)
+        if n_states > self.ring.slot_batch_size:
+            raise ValueError('Batch of {} states does not fit a slot of {}'.format(n_states,
+                                                                                 self.ring.slot_batch_size))
+        self.ring.inputs[self.slot, :n_states] = states
+        self.ring.batch_sizes[self.slot] = n_states
+        self.ring.status[self.slot] = SLOT_READY
+        self.ring.requests.release()
+        with tracing.span('remote_model_wait', 'model', slot=self.slot):
+            self.ring.done[self.slot].acquire()
+        return self.ring.policies[self.slot, :n_states], self.ring.values[self.slot, :n_states]
+
+
+class InferenceServer(object):
+    """
+    Evaluates the requests in a SlotRing with model, batching together every slot that is
+    waiting.  States are copied from the slots into a preallocated batch that is fed to the
+    model.  A single waiting slot is fed straight from shared memory.
+
+    Parameters
+    ----------
+    model: function
+        [prob_vector], [value] = model(states), such as a DualNet
+    ring: SlotRing
+        the slots to serve
+    """
+    def __init__(self, model, ring):
+        self.model = model
+        self.ring = ring
+        self.batch = np.zeros((ring.n_slots * ring.slot_batch_size,) + ring.inputs.shape[2:],
+                              dtype=ring.inputs.dtype)
+        self.n_batches = 0
+        self.n_states = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def serve_once(self, timeout=None):
+        """
+        Waits up to timeout seconds for a request, then evaluates every waiting slot.
+        Returns the number of slots served.
+        """
+        if not self.ring.requests.acquire(timeout=timeout):
+            return 0
+        # requests that arrived meanwhile are served in the same batch
+        while self.ring.requests.acquire(block=False):
+            pass
+        slots = np.flatnonzero(self.ring.status == SLOT_READY)
+        if len(slots) == 0:
+            return 0
+
+        batch_sizes = self.ring.batch_sizes[slots]
+        if len(slots) == 1:
+            states = self.ring.inputs[slots[0], :batch_sizes[0]]
+        else:
+            n_states = 0
+            for slot, batch_size in zip(slots, batch_sizes):
+                self.batch[n_states:n_states + batch_size] = self.ring.inputs[slot, :batch_size]
+                n_states += batch_size
+            states = self.batch[:n_states]
+
+        with tracing.span('inference_server_batch', 'model', batch_size=len(states), n_slots=len(slots)):
+            policies, values = self.model(states)
+
+        start = 0
+        for slot, batch_size in zip(slots, batch_sizes):
+            self.ring.policies[slot, :batch_size] = policies[start:start + batch_size]
+            self.ring.values[slot, :batch_size] = np.reshape(values[start:start + batch_size], (batch_size, 1))
+            start += batch_size
+            self.ring.status[slot] = SLOT_IDLE
+            self.ring.done[slot].release()
+        self.n_batches += 1
+        self.n_states += len(states)
+        return len(slots)
+
+    def serve_forever(self, poll_interval=0.1):
+        """
+        Serves requests until stop is called
+        """
+        while not self._stop_event.is_set():
+            self.serve_once(timeout=poll_interval)
+
+    def start(self):
+        """
+        Serves requests on a background thread of this process
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,6 +1,9 @@
 import numpy as np
 import chess
 
+from chess_env import STATE_DTYPE, apply_move
+from zobrist import ZobristTable
+
 INDEX_TO_PIECE_MAP = {0: chess.KING,
                       1: chess.QUEEN,
                       2: chess.KING}
@@ -10,11 +13,13 @@ CHAR_TO_INDEX_MAP = {'K': 0,
                      'k': 2}
 
 KQK_CHESS_INPUT_SHAPE = (8, 8, 4)
+TURN_PLANE = 3
 KQK_POSITION_POSITION_PIECE_ACTION_SIZE = 64 * 64 * 3
 
 
 def map_xy_to_square(x, y):
-    return int(8*y + x)
+    # x and y may be single element arrays as returned by np.where
+    return int(np.squeeze(8*y + x))
 
 
 def map_square_to_xy(square):
@@ -48,6 +53,9 @@ class KQKChessEnv(object):
     """
     def __init__(self, state_regime, action_regime):
         self.input_shape = KQK_CHESS_INPUT_SHAPE
+        self.state_dtype = STATE_DTYPE
+        self.zobrist = ZobristTable(self.input_shape)
+        self.side_to_move_key = self.zobrist.plane_key(TURN_PLANE)
         self.state_regime = state_regime
         self.action_regime = action_regime
         if action_regime == 'KQK_pos_pos_piece':
@@ -60,11 +68,45 @@ class KQKChessEnv(object):
 
     # The following 4 methods are called outside of the environment
     def get_next_state(self, state, action):
-        board = self.map_state_to_board(state)
-        move = self.map_action_to_move(state, action)
-        board.push(move)
-        next_state = self.map_board_to_state(board)
-        return next_state
+        """
+        Returns the state after taking action.  Only the squares the move changes are updated
+        in a copy of state, see apply_move.
+        """
+        return apply_move(self, state, action, TURN_PLANE)[0]
+
+    def move_changes(self, state, action):
+        """
+        Returns the list of (x, y, plane) entries of state that flip when action is taken, not
+        counting the side to move: the moving piece leaving its square and arriving on the
+        next, and the queen if the black king captures it.
+        """
+        # the leading four action dims are from_x, from_y, to_x, to_y in both regimes
+        from_x, from_y, to_x, to_y = np.unravel_index(int(action), self.action_dims)[:4]
+        moving_plane = int(np.flatnonzero(state[from_x, from_y, :TURN_PLANE])[0])
+        changes = [(from_x, from_y, moving_plane), (to_x, to_y, moving_plane)]
+        captured_planes = np.flatnonzero(state[to_x, to_y, :TURN_PLANE])
+        if captured_planes.size:
+            changes.append((to_x, to_y, int(captured_planes[0])))
+        return changes
+
+    def hash_state(self, state):
+        """
+        Returns the 64 bit Zobrist hash of state as an int
+        """
+        return self.zobrist.hash_state(state)
+
+    def hash_states(self, states):
+        """
+        Returns a uint64 array of the Zobrist hashes of a batch of states
+        """
+        return self.zobrist.hash_states(states)
+
+    def get_next_state_with_hash(self, state, state_hash, action):
+        """
+        Returns a tuple of (next_state, next_hash), the state after taking action and its hash
+        updated from state_hash, the hash of state, with only the entries the move changes
+        """
+        return apply_move(self, state, action, TURN_PLANE, state_hash)
 
     def get_legal_actions(self, state):
         board = self.map_state_to_board(state)
@@ -79,7 +121,7 @@ class KQKChessEnv(object):
     def get_legality_mask(self, state):
         board = self.map_state_to_board(state)
         legal_moves = board.legal_moves
-        legal_moves_as_indices = [self.move_to_index(move) for move in legal_moves]
+        legal_moves_as_indices = [self.move_to_index(board, move) for move in legal_moves]
         move_legality_mask = np.zeros(self.action_size)
         for index in legal_moves_as_indices:
             move_legality_mask[index] = 1
@@ -121,13 +163,13 @@ class KQKChessEnv(object):
     def map_board_to_state(self, board):
         if self.state_regime == 'KQK_conv':
             pieces = board.piece_map()
-            state = np.zeros((8, 8, 4), dtype=int)
+            state = np.zeros((8, 8, 4), dtype=STATE_DTYPE)
             for square in pieces:
                 piece = pieces[square]
                 piece = str(piece)
                 x, y = map_square_to_xy(square)
                 state[x, y, CHAR_TO_INDEX_MAP[piece]] = 1
-            state[:, :, 3] = board.turn * np.ones((8, 8))
+            state[:, :, 3] = board.turn
             return state
 
     def map_state_to_board(self, state):
@@ -150,35 +192,7 @@ class KQKChessEnv(object):
 
     def map_move_to_action(self, board, move):
         if self.state_regime == 'KQK_conv':
-            if self.action_regime == 'KQK_pos_pos_piece':
-                action = np.zeros((8, 8, 8, 8, 3), dtype=int)
-                from_x, from_y = map_square_to_xy(move.from_square)
-                to_x, to_y = map_square_to_xy(move.to_square)
-                piece = board.piece_at(move.from_square)
-                piece_type = piece.piece_type
-                piece_color = piece.color
-                if piece_type == chess.KING and piece_color == chess.WHITE:
-                    action[from_x, from_y, to_x, to_y, 0] = 1
-                elif piece_type == chess.QUEEN and piece_color == chess.WHITE:
-                    action[from_x, from_y, to_x, to_y, 1] = 1
-                elif piece_type == chess.KING and piece_color == chess.BLACK:
-                    action[from_x, from_y, to_x, to_y, 2] = 1
-                return self.convert_action_to_int(action)
-
-            elif self.action_regime == 'KQK_pos_pos':
-                action = np.zeros((8, 8, 8, 8))
-                from_x, from_y = map_square_to_xy(move.from_square)
-                to_x, to_y = map_square_to_xy(move.to_square)
-                piece = board.piece_at(move.from_square)
-                piece_type = piece.piece_type
-                piece_color = piece.color
-                if piece_type == chess.KING and piece_color == chess.WHITE:
-                    action[from_x, from_y, to_x, to_y] = 1
-                elif piece_type == chess.QUEEN and piece_color == chess.WHITE:
-                    action[from_x, from_y, to_x, to_y] = 1
-                elif piece_type == chess.KING and piece_color == chess.BLACK:
-                    action[from_x, from_y, to_x, to_y] = 1
-                return self.convert_action_to_int(action)
+            return self.move_to_index(board, move)
 
     def map_action_to_move(self, state, action):
         if self.state_regime == 'KQK_conv':
@@ -198,19 +212,24 @@ class KQKChessEnv(object):
                 to_square = map_xy_to_square(to_x, to_y)
                 return chess.Move(from_square, to_square)
 
-    def move_to_index(self, move):
+    def move_to_index(self, board, move):
         """
-        Translates a chess move to the appropriate index in the action space.
+        Translates a chess move to the appropriate index in the action space, the index of
+        (from_x, from_y, to_x, to_y), followed by the moving piece's plane in the
+        KQK_pos_pos_piece regime, in action_dims.
         Parameters
         ----------
+        board: chess.Board the move is played on
         move: chess.Move instance
 
         Returns the index into the action space
         """
-        uci = move.uci()
-        from_pos = self.position_to_index(uci[:2])
-        to_pos = self.position_to_index(uci[2:])
-        return 64 * from_pos + to_pos
+        from_x, from_y = map_square_to_xy(move.from_square)
+        to_x, to_y = map_square_to_xy(move.to_square)
+        multi_index = (from_x, from_y, to_x, to_y)
+        if self.action_regime == 'KQK_pos_pos_piece':
+            multi_index += (CHAR_TO_INDEX_MAP[board.piece_at(move.from_square).symbol()],)
+        return int(np.ravel_multi_index(multi_index, self.action_dims))
 
     def position_to_index(self, position):
         """
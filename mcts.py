@@ -1,8 +1,29 @@
 from functools import partial
+import multiprocessing
+import os
+import threading
+import time
 
 import numpy as np
 
-from tree import Node, create_new_connection
+from search_stats import SearchStats, TimedEnv, TimedModel
+import tracing
+from tree import (Node,
+                  collapse_node,
+                  connect_child,
+                  count_nodes,
+                  create_new_connection,
+                  new_node,
+                  prune_to_subtree,
+                  release_subtree)
+
+# when a search goes over its node budget, subtrees are evicted until the tree is back
+# under this fraction of the budget, so evictions happen in batches rather than every rollout
+EVICTION_TARGET_FRACTION = 0.9
+
+# value charged to every edge a worker thread is currently searching through, so that
+# other threads are steered towards different lines until the real value is backed up
+VIRTUAL_LOSS = 1.0
 
 
 def exploration_bonus_for_c_puct(edge, c_puct):
@@ -45,45 +66,186 @@ def backup(node, value):
         count += 1
 
 
-def expand_node(node, model, env):
+def get_child_node(edge, env, node_pool=None):
     """
-    For all legal actions possible from a node, create and connect edges
-    to subsequent states. Returns the value of the current state as
-    calculated by the model.
+    Returns the node at the end of edge.  Child states are only computed the
+    first time an edge is followed, since most children are never visited.
+    The new node is taken from node_pool when one is given.
     """
-    if env.is_game_over(node.state):
-        node.is_expanded = True
-        node.is_terminal = True
+    if edge.out_node is None:
+        connect_child(edge, successor_node(edge.in_node, edge.action, env, node_pool))
+    return edge.out_node
+
+
+def successor_node(node, action, env, node_pool=None):
+    """
+    Returns a new, unconnected node for the state after taking action from node.  If env
+    hashes states, the new node's state_hash is updated from node's, and node's is computed
+    in full the first time, so only the root of a search is ever hashed from scratch.
+    """
+    if not hasattr(env, 'get_next_state_with_hash'):
+        return new_node(env.get_next_state(node.state, action), node_pool)
+    if node.state_hash is None:
+        node.state_hash = env.hash_state(node.state)
+    next_state, next_hash = env.get_next_state_with_hash(node.state, node.state_hash, action)
+    return new_node(next_state, node_pool, next_hash)
+
+
+def evaluate_state(state, model, env, timed=False):
+    """
+    Runs the env and model on a node's state without touching the tree.  Returns a tuple of
+    (value, legal_actions, priors, model_time), where priors holds the prior of each of
+    legal_actions.  legal_actions and priors are None when the node is terminal.  The model
+    call is only timed when timed is True, model_time is 0.0 otherwise.
+
+    A model with a predict_legal method, like DualNet, is asked for the priors of the legal
+    actions only.  Otherwise they are read off the full policy returned by calling the model.
+    """
+    if env.is_game_over(state):
         value = -1  # the game is over on my turn, so I have lost
-        return value
-
-    vec_action_probs, values = model(np.array([node.state]))
-    # need to take [0] index of vector since we're only putting in one state
-    action_probs = vec_action_probs[0]
-    value = values[0]
-    legal_actions = env.get_legal_actions(node.state)
-    for action in legal_actions:
-        action_prob = action_probs[action]
-        next_state = env.get_next_state(node.state, action)
-        child_node = Node(next_state)
-        create_new_connection(node, child_node, action, action_prob)
+        return value, None, None, 0.0
+
+    legal_actions = env.get_legal_actions(state)
+    model_time = 0.0
+    if timed:
+        model_start_time = time.perf_counter()
+    with tracing.span('model_call', 'model'):
+        if hasattr(model, 'predict_legal'):
+            legal_priors, values = model.predict_legal(np.array([state]), [legal_actions])
+            priors = legal_priors[0]
+        else:
+            vec_action_probs, values = model(np.array([state]))
+            priors = [vec_action_probs[0][action] for action in legal_actions]
+    if timed:
+        model_time = time.perf_counter() - model_start_time
+    # need to take [0] index of value since we're only putting in one state
+    # and value is an array of dimension 1
+    return values[0][0], legal_actions, priors, model_time
+
+
+def attach_children(node, legal_actions, priors):
+    """
+    Creates an edge storing each legal action and its prior.
+    Child nodes are created lazily by get_child_node.
+    """
+    if legal_actions is None:
+        node.is_terminal = True
+    else:
+        for action, prior in zip(legal_actions, priors):
+            create_new_connection(node, None, action, prior)
     node.is_expanded = True
-    # need to take [0] index of value since value is an array of dimension 1
-    return value[0]
+
+
+def expand_node(node, model, env, callbacks=None):
+    """
+    For all legal actions possible from a node, create and connect edges
+    storing the action and its prior. Child nodes are created lazily by
+    get_child_node. Returns the value of the current state as calculated
+    by the model.
+    callbacks is an optional list of SearchCallbacks told about the expansion.
+    """
+    value, legal_actions, priors, model_time = evaluate_state(node.state, model, env, timed=bool(callbacks))
+    attach_children(node, legal_actions, priors)
+    for callback in callbacks or []:
+        callback.on_node_expanded(node, model_time)
+    return value
+
+
+def add_virtual_loss(path, virtual_loss):
+    for edge in path:
+        edge.num_visits += 1
+        edge.total_action_value -= virtual_loss
+
+
+def remove_virtual_loss(path, virtual_loss):
+    for edge in path:
+        edge.num_visits -= 1
+        edge.total_action_value += virtual_loss
+
+
+def pin_path(pinned, path):
+    """
+    Counts the nodes along path in pinned, a dict from node to the number of rollouts
+    passing through it, so that evict_subtrees leaves them alone
+    """
+    for edge in path:
+        pinned[edge.out_node] = pinned.get(edge.out_node, 0) + 1
+
+
+def unpin_path(pinned, path):
+    for edge in path:
+        pinned[edge.out_node] -= 1
+        if pinned[edge.out_node] == 0:
+            del pinned[edge.out_node]
+
+
+def evict_subtrees(root_node, num_nodes_to_free, node_pool=None, pinned=()):
+    """
+    Collapses the least visited subtrees below root_node back into unexpanded
+    leaves until at least num_nodes_to_free nodes have been released.  Edges into
+    collapsed nodes keep their visit counts and action values, and a collapsed
+    node is expanded again the next time search reaches it.  Nodes in pinned, such as
+    those on the lines rollouts in other threads are evaluating, are never collapsed.
+    Returns the number of nodes released.
+    """
+    candidates = []
+    stack = [(root_node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        for edge in node.outgoing_edges:
+            child = edge.out_node
+            # collapsing a node whose children were never created frees nothing and
+            # throws away its priors, so only nodes with created children are candidates
+            if child is not None and any(child_edge.out_node is not None for child_edge in child.outgoing_edges):
+                if child not in pinned:
+                    candidates.append((edge.num_visits, depth, child))
+                stack.append((child, depth + 1))
+    # a child never has more visits than its parent, and ties go to the deeper node,
+    # so every subtree is considered before its ancestors
+    candidates.sort(key=lambda candidate: (candidate[0], -candidate[1]))
+
+    num_freed = 0
+    for _, _, node in candidates:
+        if num_freed >= num_nodes_to_free:
+            break
+        num_freed += collapse_node(node, node_pool)
+    return num_freed
+
+
+def is_search_settled(root_node, n_remaining):
+    """
+    Returns True when the most visited action at the root can't be overtaken
+    by any other action in n_remaining more rollouts.
+    """
+    visit_counts = sorted([edge.num_visits for edge in root_node.outgoing_edges], reverse=True)
+    if len(visit_counts) < 2:
+        return True
+    return visit_counts[0] - visit_counts[1] > n_remaining
 
 
 def perform_rollouts(root_node,
                      n_leaf_expansions,
                      model,
                      env,
-                     exploration_bonus):
+                     exploration_bonus,
+                     node_pool=None,
+                     max_nodes=None,
+                     time_budget=None,
+                     early_stopping=False,
+                     n_threads=1,
+                     stats=None,
+                     callbacks=None,
+                     stop_event=None):
     """
+    Returns the number of rollouts performed.
+
     Parameters
     ----------
     root_node: Node
         initial node to start MCTS
     n_leaf_expansions: int
-        number of leaves to expand in each iteration of MCTS when picking an action
+        number of leaves to expand in each iteration of MCTS when picking an action.
+        May be None when a time_budget or stop_event is given.
     model: function
         Model to use for computing the value of each state,
         prob_vector, value = model(node.state)
@@ -92,24 +254,238 @@ def perform_rollouts(root_node,
     exploration_bonus: function
         Function that takes (edge) as input and returns a score based on
         how good the edge is to explore with our exploration rate.
+    node_pool: NodePool
+        optional pool to recycle nodes from when creating children
+    max_nodes: int
+        optional cap on the size of the tree.  When the tree grows past it, the least
+        visited subtrees are collapsed into unexpanded leaves and the search continues.
+    time_budget: float
+        optional number of seconds to search for.  At least one rollout is always performed.
+    early_stopping: boolean
+        If set to True, stop as soon as the most visited action at the root can no longer
+        be overtaken by the rollouts left in the budget.
+    n_threads: int
+        number of worker threads descending the tree at the same time.  Each thread charges
+        a virtual loss to the line it is searching so the threads spread out, and the model
+        is called outside of the tree lock so threads keep selecting while others wait on it.
+    stats: SearchStats
+        optional object to record time and call counts for each phase of the search in.
+        Nothing is timed when it is None.
+    callbacks: list
+        optional SearchCallbacks called when a leaf is selected, a node is expanded, a value
+        is backed up and the search is complete.
+    stop_event: threading.Event
+        optional event that stops the search once it is set, checked before every rollout
     """
-    cur_node = root_node
+    if n_leaf_expansions is None and time_budget is None and stop_event is None:
+        raise ValueError('perform_rollouts needs n_leaf_expansions, a time_budget or a stop_event, '
+                         'or it would never stop')
+    start_time = time.perf_counter()
+    callbacks = list(callbacks) if callbacks is not None else []
+    if stats is not None:
+        model = TimedModel(model, stats)
+        env = TimedEnv(env, stats)
+        callbacks.append(stats)
     # add all edges and children for current node
     if not root_node.is_expanded:
-        value = expand_node(root_node, model, env)
+        expand_node(root_node, model, env, callbacks)
+    num_nodes = count_nodes(root_node) if max_nodes is not None else 0
+    n_started = 0
+    n_performed = 0
+    errors = []
+    virtual_loss = VIRTUAL_LOSS if n_threads > 1 else 0.0
+    # nodes on the paths of rollouts that are being evaluated.  every node on a path is
+    # pinned, its ancestors included, so eviction can't release or detach an in-flight leaf
+    pinned = {}
+    # guards the tree and the counters above.  it is held while selecting and while backing up,
+    # but not while the env and model evaluate a leaf, which is where the time goes
+    lock = threading.Lock()
+
+    def should_stop():
+        if errors:
+            return True
+        if stop_event is not None and stop_event.is_set():
+            return True
+        if n_leaf_expansions is not None and n_started >= n_leaf_expansions:
+            return True
+        if n_performed == 0 or (time_budget is None and not early_stopping):
+            return False
+        elapsed = time.perf_counter() - start_time
+        if time_budget is not None and elapsed >= time_budget:
+            return True
+        if early_stopping:
+            n_remaining = np.inf
+            if n_leaf_expansions is not None:
+                n_remaining = n_leaf_expansions - n_started
+            if time_budget is not None:
+                # estimate how many more rollouts fit in the time left at the current rate
+                n_remaining = min(n_remaining, (time_budget - elapsed) * n_performed / max(elapsed, 1e-6))
+            return is_search_settled(root_node, n_remaining)
+        return False
 
-    while n_leaf_expansions > 0:
-        edge = select(root_node, exploration_bonus)
-        # find a node you haven't expanded yet, expand it
-        # or, if you get to a terminal state, stop expanding
-        while edge.num_visits != 0 and not edge.out_node.is_terminal:
-            cur_node = edge.out_node
-            edge = select(cur_node, exploration_bonus)
-        cur_node = edge.out_node
-        value = expand_node(cur_node, model, env)
-        backup(cur_node, value)
+    def select_leaf():
+        """
+        Returns the path of edges from root_node to a node that hasn't been expanded yet,
+        or to a terminal node
+        """
+        nonlocal num_nodes
+        path = [select(root_node, exploration_bonus)]
+        while path[-1].out_node is not None and path[-1].out_node.is_expanded and not path[-1].out_node.is_terminal:
+            path.append(select(path[-1].out_node, exploration_bonus))
+        if path[-1].out_node is None:
+            num_nodes += 1
+        get_child_node(path[-1], env, node_pool)
+        return path
 
-        n_leaf_expansions -= 1
+    def run_rollouts():
+        nonlocal n_started, n_performed, num_nodes
+        while True:
+            with lock:
+                if should_stop():
+                    return
+                n_started += 1
+                if callbacks:
+                    select_start_time = time.perf_counter()
+                path = select_leaf()
+                if callbacks:
+                    select_time = time.perf_counter() - select_start_time
+                    for callback in callbacks:
+                        callback.on_leaf_selected(path, select_time)
+                add_virtual_loss(path, virtual_loss)
+                pin_path(pinned, path)
+                leaf = path[-1].out_node
+                leaf_state = leaf.state
+            value, legal_actions, priors, model_time = evaluate_state(leaf_state, model, env, timed=bool(callbacks))
+            with lock:
+                remove_virtual_loss(path, virtual_loss)
+                unpin_path(pinned, path)
+                # another thread may have expanded the same leaf in the meantime
+                if not leaf.is_expanded:
+                    attach_children(leaf, legal_actions, priors)
+                    for callback in callbacks:
+                        callback.on_node_expanded(leaf, model_time)
+                if callbacks:
+                    backup_start_time = time.perf_counter()
+                backup(leaf, value)
+                if callbacks:
+                    backup_time = time.perf_counter() - backup_start_time
+                    for callback in callbacks:
+                        callback.on_backup_complete(leaf, value, backup_time)
+                n_performed += 1
+
+                if max_nodes is not None and num_nodes > max_nodes:
+                    target = int(EVICTION_TARGET_FRACTION * max_nodes)
+                    num_nodes -= evict_subtrees(root_node, num_nodes - target, node_pool, pinned)
+
+    def run_rollouts_in_thread():
+        try:
+            run_rollouts()
+        except Exception as e:
+            errors.append(e)
+
+    if n_threads == 1:
+        run_rollouts()
+    else:
+        threads = [threading.Thread(target=run_rollouts_in_thread) for _ in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+    elapsed = time.perf_counter() - start_time
+    for callback in callbacks:
+        callback.on_search_complete(root_node, n_performed, elapsed)
+    return n_performed
+
+
+def search_visit_counts(root_state, n_leaf_expansions, model, env, c_puct, max_nodes, time_budget, early_stopping,
+                        seed):
+    """
+    Runs an independent search from a fresh tree rooted at root_state and returns the root visit
+    counts as a vector of length env.action_size.  This is the work done by each process of a
+    root-parallel search.
+    """
+    np.random.seed(seed)
+    root_node = Node(root_state)
+    exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c_puct)
+    perform_rollouts(root_node, n_leaf_expansions, model, env, exploration_bonus, None, max_nodes, time_budget,
+                     early_stopping)
+    visit_counts = np.zeros(env.action_size)
+    for edge in root_node.outgoing_edges:
+        visit_counts[edge.action] = edge.num_visits
+    return visit_counts
+
+
+# the model and env of a search pool's worker process, set once when the worker starts
+_search_worker_context = {}
+
+
+def _init_search_worker(model, env, entropy):
+    # forked workers start with copies of the same random state, so each gives its model a
+    # stream of its own, spawned from the pool's entropy with the worker's pid as spawn key
+    if hasattr(model, 'reseed'):
+        model.reseed(np.random.SeedSequence(entropy, spawn_key=(os.getpid(),)))
+    _search_worker_context['model'] = model
+    _search_worker_context['env'] = env
+
+
+def _search_visit_counts_in_worker(root_state, n_leaf_expansions, c_puct, max_nodes, time_budget, early_stopping,
+                                   seed):
+    return search_visit_counts(root_state, n_leaf_expansions, _search_worker_context['model'],
+                               _search_worker_context['env'], c_puct, max_nodes, time_budget, early_stopping, seed)
+
+
+def make_search_pool(n_processes, model, env):
+    """
+    Returns a process pool for root_parallel_visit_counts.  model and env are pickled once into
+    each worker when it starts, instead of with every search, so the pool can be kept for a whole
+    game.  Searches in the pool keep using this model, so make a new pool after changing its
+    weights.  model and env must be picklable.
+
+    A model with a reseed method, like game.BatchRandomModel, is reseeded in every worker so
+    the workers don't all draw the same random numbers.
+    """
+    entropy = np.random.SeedSequence().entropy
+    return multiprocessing.Pool(n_processes, _init_search_worker, (model, env, entropy))
+
+
+def split_rollouts(n_leaf_expansions, n_processes):
+    """
+    Returns the number of rollouts for each of n_processes searches, adding up to exactly
+    n_leaf_expansions.  Searches that would get none are left out, and each search gets None
+    when n_leaf_expansions is None.
+    """
+    if n_leaf_expansions is None:
+        return [None] * n_processes
+    n_per_process, n_extra = divmod(n_leaf_expansions, n_processes)
+    counts = [n_per_process + 1] * n_extra + [n_per_process] * (n_processes - n_extra)
+    return [count for count in counts if count > 0]
+
+
+def root_parallel_visit_counts(root_node, n_leaf_expansions, model, env, c_puct, n_processes, max_nodes=None,
+                               time_budget=None, early_stopping=False, pool=None):
+    """
+    Runs n_processes independent searches from root_node's state in a process pool, each
+    with its own random seed, and returns the sum of their root visit counts as a vector of
+    length env.action_size.  The rollouts are split between the processes (see split_rollouts),
+    and each process searches for the whole time_budget.  root_node itself is left untouched.
+
+    pool is a pool from make_search_pool for the same model and env, which saves starting the
+    processes and sending them the model on every call.  Without one, a pool is made for the
+    call, so model and env must be picklable.
+    """
+    if pool is None:
+        with make_search_pool(n_processes, model, env) as pool:
+            return root_parallel_visit_counts(root_node, n_leaf_expansions, model, env, c_puct, n_processes,
+                                              max_nodes, time_budget, early_stopping, pool)
+    rollout_counts = split_rollouts(n_leaf_expansions, n_processes)
+    # seeds are drawn from the global random state so seeding this process makes the search reproducible
+    seeds = np.random.randint(2**31 - 1, size=len(rollout_counts))
+    args = [(root_node.state, n_rollouts, c_puct, max_nodes, time_budget, early_stopping, seed)
+            for n_rollouts, seed in zip(rollout_counts, seeds)]
+    all_visit_counts = pool.starmap(_search_visit_counts_in_worker, args)
+    return np.sum(all_visit_counts, axis=0)
 
 
 def get_action_distribution(root_node,
@@ -117,7 +493,16 @@ def get_action_distribution(root_node,
                             n_leaf_expansions,
                             model,
                             env,
-                            c_puct):
+                            c_puct,
+                            node_pool=None,
+                            max_nodes=None,
+                            time_budget=None,
+                            early_stopping=False,
+                            n_threads=1,
+                            n_processes=1,
+                            return_stats=False,
+                            callbacks=None,
+                            pool=None):
     """
     Returns the distribution over all actions after exploring the trees.
     This distribution pi(s) should be an improvement over the original p(s)
@@ -138,24 +523,77 @@ def get_action_distribution(root_node,
         game playing environment that can progress game state and give us legal moves
     c_puct: float
         Constant that dictates how much score is assigned to exploring.
+    node_pool: NodePool
+        optional pool to recycle nodes from when expanding
+    max_nodes: int
+        optional cap on the size of the search tree, see perform_rollouts
+    time_budget: float
+        optional number of seconds to search for, n_leaf_expansions may then be None
+    early_stopping: boolean
+        If set to True, stop searching once the most visited action can't change.
+        The distribution found so far is returned either way.
+    n_threads: int
+        number of threads searching the tree in parallel, see perform_rollouts
+    n_processes: int
+        If greater than 1, run that many independent searches from the root state in a process
+        pool and merge their root visit counts (see root_parallel_visit_counts).  root_node's
+        own tree is not searched or grown in that case.
+    return_stats: boolean
+        If set to True, return a tuple of (distribution, SearchStats) with timings for the
+        search.  A root-parallel search only records its wall time and rollout count.
+    callbacks: list
+        optional SearchCallbacks to observe the search with, see perform_rollouts.  They are
+        not called by a root-parallel search.
+    pool: multiprocessing.Pool
+        optional pool from make_search_pool to run a root-parallel search in
     """
-    # set up the exploration_bonus function with the constant specified
-    exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c_puct)
+    stats = SearchStats() if return_stats else None
+    if n_processes > 1:
+        start_time = time.perf_counter()
+        with tracing.span('root_parallel_search', 'mcts', n_processes=n_processes):
+            visit_counts = root_parallel_visit_counts(root_node, n_leaf_expansions, model, env, c_puct, n_processes,
+                                                      max_nodes, time_budget, early_stopping, pool)
+        if stats is not None:
+            stats.record_search(time.perf_counter() - start_time, int(visit_counts.sum()), 0)
+    else:
+        # set up the exploration_bonus function with the constant specified
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c_puct)
 
-    perform_rollouts(root_node, n_leaf_expansions, model, env, exploration_bonus)
-    visit_counts = np.array([edge.num_visits for edge in root_node.outgoing_edges])
+        with tracing.span('search', 'mcts'):
+            perform_rollouts(root_node, n_leaf_expansions, model, env, exploration_bonus, node_pool, max_nodes,
+                             time_budget, early_stopping, n_threads, stats, callbacks)
+        # our distribution is only over legal actions, some subset of the action space
+        # all illegal actions have zero probability due to being unexplored
+        visit_counts = np.zeros(env.action_size)
+        for edge in root_node.outgoing_edges:
+            visit_counts[edge.action] = edge.num_visits
 
     # scale by temperature
     distribution = np.power(visit_counts, 1/temperature)
     # normalize
     distribution = distribution / np.sum(distribution)
+    if return_stats:
+        return distribution, stats
+    return distribution
+
 
-    # our distribution is only over legal actions, some subset of the action space
-    # all illegal actions have zero probability due to being unexplored
-    total_action_distribution = np.zeros(env.action_size)
-    action_indexes = [edge.action for edge in root_node.outgoing_edges]
-    total_action_distribution[action_indexes] = distribution
-    return total_action_distribution
+def commit_move(root_node, action, env, node_pool=None):
+    """
+    Plays action from root_node.  The child reached by action becomes the root
+    of a detached tree that keeps its search statistics, and every other node of
+    the old tree is released (into node_pool, if one is given).
+
+    Returns a tuple of (next_node, num_kept, num_freed)
+    """
+    edge = [edge for edge in root_node.outgoing_edges if edge.action == action]
+    if not edge:
+        # the root was never expanded, so there is no search work to keep
+        next_node = successor_node(root_node, action, env, node_pool)
+        num_freed = release_subtree(root_node, node_pool)
+        return next_node, 1, num_freed
+    next_node = get_child_node(edge[0], env, node_pool)
+    num_kept, num_freed = prune_to_subtree(next_node, node_pool)
+    return next_node, num_kept, num_freed
 
 
 def get_next_state_with_mcts(root_node,
@@ -163,13 +601,23 @@ def get_next_state_with_mcts(root_node,
                              n_leaf_expansions,
                              model,
                              env,
-                             c_puct):
+                             c_puct,
+                             node_pool=None,
+                             max_nodes=None,
+                             time_budget=None,
+                             early_stopping=False,
+                             n_threads=1,
+                             n_processes=1,
+                             callbacks=None,
+                             pool=None):
     """
     Returns a tuple of (next_node, action_distribution) used to choose the action taken at the
-    root node.
+    root node.  The next node is detached from the rest of the tree, which is released into
+    node_pool if one is given.
     """
-    distribution = get_action_distribution(root_node, temperature, n_leaf_expansions, model, env, c_puct)
+    distribution = get_action_distribution(root_node, temperature, n_leaf_expansions, model, env, c_puct,
+                                           node_pool, max_nodes, time_budget, early_stopping, n_threads,
+                                           n_processes, callbacks=callbacks, pool=pool)
     action = np.random.choice(env.action_size, p=distribution)
-    edge = [edge for edge in root_node.outgoing_edges if edge.action == action]
-    next_node = edge[0].out_node
+    next_node, _, _ = commit_move(root_node, action, env, node_pool)
     return next_node, distribution
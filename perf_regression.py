@@ -0,0 +1,118 @@
+"""
+Performance regression check.  Runs a fixed self-play workload and compares its
+throughput against the baseline stored in perf_baseline.json.
+
+    python perf_regression.py                    # exits with status 1 on a regression
+    python perf_regression.py --update-baseline  # record this machine's numbers
+
+Baselines are machine specific, so regenerate the baseline on the host that runs the check.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+from game import BatchRandomModel, self_play_game
+from tictactoe_env import TicTacToeEnv
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json')
+# throughput metrics that fail the check when they drop
+THROUGHPUT_METRICS = ('nodes_per_second', 'positions_per_second')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak_rss / 2**20
+    return peak_rss / 2**10
+
+
+def run_workload(n_games=50, n_leaf_expansions=20, seed=0, n_repeats=3):
+    """
+    Plays n_games tic-tac-toe self-play games with a seeded BatchRandomModel and returns
+    a dict of throughput and memory metrics.  The workload is run n_repeats times and the
+    fastest run is reported, which keeps noise from other processes out of the comparison.
+    """
+    env = TicTacToeEnv()
+    timings = []
+    for _ in range(n_repeats):
+        np.random.seed(seed)
+        model = BatchRandomModel(env, seed=seed)
+        n_positions = 0
+        start_time = time.perf_counter()
+        for _ in range(n_games):
+            states, _, _ = self_play_game(model, env, n_leaf_expansions=n_leaf_expansions, max_num_turns=9)
+            n_positions += len(states)
+        timings.append(time.perf_counter() - start_time)
+    elapsed = min(timings)
+
+    return {'n_games': n_games,
+            'n_leaf_expansions': n_leaf_expansions,
+            'seed': seed,
+            'n_repeats': n_repeats,
+            'n_positions': n_positions,
+            'seconds': elapsed,
+            # every position searched runs n_leaf_expansions rollouts
+            'nodes_per_second': n_positions * n_leaf_expansions / elapsed,
+            'positions_per_second': n_positions / elapsed,
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def compare_to_baseline(metrics, baseline, threshold):
+    """
+    Returns a list of messages describing every throughput metric that dropped by more
+    than the fraction threshold relative to baseline.
+    """
+    regressions = []
+    for name in THROUGHPUT_METRICS:
+        if name not in baseline:
+            continue
+        floor = baseline[name] * (1 - threshold)
+        if metrics[name] < floor:
+            regressions.append('{} dropped to {:.1f} from a baseline of {:.1f} ({:.0%} allowed)'.format(
+                name, metrics[name], baseline[name], threshold))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fraction of baseline throughput that may be lost before failing')
+    parser.add_argument('--games', type=int, default=50)
+    parser.add_argument('--leaf-expansions', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3, help='runs of the workload, the fastest one counts')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write the measured metrics to the baseline file instead of comparing')
+    args = parser.parse_args(argv)
+
+    metrics = run_workload(args.games, args.leaf_expansions, args.seed, args.repeats)
+    print(json.dumps(metrics, indent=2, sort_keys=True))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(json.dumps(metrics, indent=2, sort_keys=True) + '\n')
+        print('Wrote baseline to {}'.format(args.baseline))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline['n_games'], baseline['n_leaf_expansions']) != (args.games, args.leaf_expansions):
+        print('Baseline was recorded for a different workload, rerun with --update-baseline')
+        return 1
+    regressions = compare_to_baseline(metrics, baseline, args.threshold)
+    for regression in regressions:
+        print('REGRESSION: ' + regression)
+    if not regressions:
+        print('No regression against {}'.format(args.baseline))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
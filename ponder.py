@@ -0,0 +1,102 @@
+from functools import partial
+import threading
+
+from mcts import commit_move, exploration_bonus_for_c_puct, perform_rollouts
+
+
+class Ponderer(object):
+    """
+    Keeps searching a tree on a background thread while the opponent is thinking, so
+    that the search is further along by the time it is our turn again.
+
+    Typical use, after we have played a move and reached next_node:
+
+        ponderer.start(next_node)
+        ...  # wait for the opponent
+        root_node = ponderer.stop(opponent_action)
+
+    root_node is the child of next_node for the opponent's move and keeps all of the
+    search work done below it while pondering.
+    """
+    def __init__(self,
+                 model,
+                 env,
+                 c_puct=1.0,
+                 node_pool=None,
+                 max_nodes=None):
+        """
+        model: function
+            Model to use for computing the value of each state,
+            [prob_vector], [value] = model([node.state])
+        env:
+            game playing environment that can progress game state and give us legal moves
+        c_puct: float
+            Constant that dictates how much score is assigned to exploring.
+        node_pool: NodePool
+            optional pool to recycle nodes from, also used when committing the opponent's move
+        max_nodes: int
+            optional cap on the size of the tree, see perform_rollouts
+        """
+        self.model = model
+        self.env = env
+        self.exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c_puct)
+        self.node_pool = node_pool
+        self.max_nodes = max_nodes
+
+        self.root_node = None
+        self.n_rollouts = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._errors = []
+
+    @property
+    def is_pondering(self):
+        return self._thread is not None
+
+    def start(self, root_node):
+        """
+        Starts searching the tree rooted at root_node in the background.
+        """
+        if self.is_pondering:
+            raise RuntimeError('Already pondering, call stop first')
+        self.root_node = root_node
+        self.n_rollouts = 0
+        self._stop_event.clear()
+        self._errors = []
+        self._thread = threading.Thread(target=self._ponder, daemon=True)
+        self._thread.start()
+
+    def stop(self, opponent_action=None):
+        """
+        Stops the background search.  Returns the node to continue searching from: the
+        child for opponent_action if one is given, or else the root that was being searched.
+        Returns None if it isn't pondering.
+        """
+        if not self.is_pondering:
+            return None
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        if self._errors:
+            raise self._errors[0]
+        if opponent_action is None:
+            return self.root_node
+        next_node, _, _ = commit_move(self.root_node, opponent_action, self.env, self.node_pool)
+        return next_node
+
+    def _ponder(self):
+        if self.env.is_game_over(self.root_node.state):
+            return
+        try:
+            # a single search that runs until stop is called, so the tree is only counted
+            # once for max_nodes rather than before every batch of rollouts
+            self.n_rollouts = perform_rollouts(self.root_node,
+                                               None,
+                                               self.model,
+                                               self.env,
+                                               self.exploration_bonus,
+                                               self.node_pool,
+                                               self.max_nodes,
+                                               stop_event=self._stop_event)
+        except Exception as e:
+            self._errors.append(e)
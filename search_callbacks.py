@@ -0,0 +1,35 @@
+class SearchCallback(object):
+    """
+    Base class for objects that want to observe a search, such as profilers, loggers
+    and visualizers.  Subclass it, override the hooks you need and pass instances to
+    perform_rollouts or expand_node through their callbacks argument.
+
+    Times are in seconds.  In a tree-parallel search the hooks are called while the tree
+    lock is held, so they see a consistent tree but should return quickly.
+    """
+    def on_leaf_selected(self, path, elapsed):
+        """
+        Called after selection.  path is the list of edges from the root to the selected
+        leaf, path[-1].out_node, and elapsed is how long selection took.
+        """
+        pass
+
+    def on_node_expanded(self, node, model_time):
+        """
+        Called after node has been given its outgoing edges.  model_time is how long the
+        model call for it took, 0 for terminal nodes.
+        """
+        pass
+
+    def on_backup_complete(self, node, value, elapsed):
+        """
+        Called after value has been backed up from node to the root.
+        """
+        pass
+
+    def on_search_complete(self, root_node, n_rollouts, elapsed):
+        """
+        Called at the end of perform_rollouts with the number of rollouts performed and
+        the total time spent.
+        """
+        pass
@@ -0,0 +1,158 @@
+import threading
+import time
+
+from search_callbacks import SearchCallback
+from tree import count_nodes
+
+
+class SearchStats(SearchCallback):
+    """
+    Cumulative timings and counts for the phases of MCTS rollouts: select, expand
+    (split between env and model calls) and backup.  Pass one to perform_rollouts as
+    stats to collect them.  A single object can be reused to accumulate over several searches.
+    Recording is thread safe so tree-parallel searches can share one.
+
+    Selection time includes creating the node for the selected leaf, whose env call is
+    also counted in env_time.  nodes_per_second counts leaf expansions.
+    """
+    def __init__(self):
+        self.n_rollouts = 0
+        self.wall_time = 0.0
+        self.select_time = 0.0
+        self.select_calls = 0
+        self.total_selection_depth = 0
+        self.env_time = 0.0
+        self.env_calls = 0
+        self.model_time = 0.0
+        self.model_calls = 0
+        # map from batch size to the number of model calls made with it
+        self.batch_sizes = {}
+        self.backup_time = 0.0
+        self.backup_calls = 0
+        self.tree_size = 0
+        self._lock = threading.Lock()
+
+    def record_select(self, elapsed, depth):
+        with self._lock:
+            self.select_time += elapsed
+            self.select_calls += 1
+            self.total_selection_depth += depth
+
+    def record_env_call(self, elapsed):
+        with self._lock:
+            self.env_time += elapsed
+            self.env_calls += 1
+
+    def record_model_call(self, elapsed, batch_size):
+        with self._lock:
+            self.model_time += elapsed
+            self.model_calls += 1
+            self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+
+    def record_backup(self, elapsed):
+        with self._lock:
+            self.backup_time += elapsed
+            self.backup_calls += 1
+
+    def record_search(self, elapsed, n_rollouts, tree_size):
+        with self._lock:
+            self.wall_time += elapsed
+            self.n_rollouts += n_rollouts
+            self.tree_size = tree_size
+
+    def on_leaf_selected(self, path, elapsed):
+        self.record_select(elapsed, len(path))
+
+    def on_backup_complete(self, node, value, elapsed):
+        self.record_backup(elapsed)
+
+    def on_search_complete(self, root_node, n_rollouts, elapsed):
+        self.record_search(elapsed, n_rollouts, count_nodes(root_node))
+
+    @property
+    def expand_time(self):
+        return self.env_time + self.model_time
+
+    @property
+    def nodes_per_second(self):
+        if self.wall_time == 0:
+            return 0.0
+        return self.n_rollouts / self.wall_time
+
+    @property
+    def average_selection_depth(self):
+        if self.select_calls == 0:
+            return 0.0
+        return self.total_selection_depth / self.select_calls
+
+    def as_dict(self):
+        return {'n_rollouts': self.n_rollouts,
+                'wall_time': self.wall_time,
+                'nodes_per_second': self.nodes_per_second,
+                'select_time': self.select_time,
+                'select_calls': self.select_calls,
+                'average_selection_depth': self.average_selection_depth,
+                'expand_time': self.expand_time,
+                'env_time': self.env_time,
+                'env_calls': self.env_calls,
+                'model_time': self.model_time,
+                'model_calls': self.model_calls,
+                'batch_sizes': dict(self.batch_sizes),
+                'backup_time': self.backup_time,
+                'backup_calls': self.backup_calls,
+                'tree_size': self.tree_size}
+
+    def __repr__(self):
+        return 'SearchStats. {}'.format(self.as_dict())
+
+
+class TimedModel(object):
+    """
+    Wraps a model so the time and batch size of every call is recorded in stats.
+    Everything else is passed through to the wrapped model.
+    """
+    def __init__(self, model, stats):
+        self.model = model
+        self.stats = stats
+
+    def __call__(self, states):
+        start_time = time.perf_counter()
+        result = self.model(states)
+        self.stats.record_model_call(time.perf_counter() - start_time, len(states))
+        return result
+
+    def __getattr__(self, name):
+        attribute = getattr(self.model, name)
+        if name == 'predict_legal':
+            return self._timed_predict_legal
+        return attribute
+
+    def _timed_predict_legal(self, states, legal_actions=None):
+        start_time = time.perf_counter()
+        result = self.model.predict_legal(states, legal_actions)
+        self.stats.record_model_call(time.perf_counter() - start_time, len(states))
+        return result
+
+
+class TimedEnv(object):
+    """
+    Wraps an env so the time of every call to one of its search methods is recorded
+    in stats.  Everything else is passed through to the wrapped env.
+    """
+    TIMED_METHODS = ('get_next_state', 'get_next_state_with_hash', 'get_legal_actions', 'is_game_over')
+
+    def __init__(self, env, stats):
+        self.env = env
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attribute = getattr(self.env, name)
+        if name not in self.TIMED_METHODS:
+            return attribute
+
+        def timed(*args, **kwargs):
+            start_time = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            self.stats.record_env_call(time.perf_counter() - start_time)
+            return result
+        return timed
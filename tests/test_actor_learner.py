@@ -0,0 +1,78 @@
+import unittest
+
+import numpy as np
+
+from actor_learner import ActorLearner, ReplayBuffer, StageCounters, WeightBroadcast
+from tictactoe_env import TicTacToeEnv
+
+from utils import MockTrainableModel
+
+
+class TestWeightBroadcast(unittest.TestCase):
+    def setUp(self):
+        self.weights = {'conv': np.arange(6, dtype=np.float32).reshape(2, 3),
+                        'quantized': np.array([1, -2, 3], dtype=np.int8)}
+        self.broadcast = WeightBroadcast.create(self.weights)
+
+    def tearDown(self):
+        self.broadcast.close()
+        self.broadcast.unlink()
+
+    def test_fetch_only_newer(self):
+        self.assertEqual(self.broadcast.fetch(), (0, None))
+        version = self.broadcast.publish(self.weights)
+        self.assertEqual(version, 1)
+        version, weights = self.broadcast.fetch()
+        self.assertEqual(version, 1)
+        np.testing.assert_array_equal(weights['conv'], self.weights['conv'])
+        self.assertEqual(weights['quantized'].dtype, np.int8)
+        self.assertEqual(self.broadcast.fetch(version), (1, None))
+
+    def test_fetched_weights_are_copies(self):
+        self.broadcast.publish(self.weights)
+        _, weights = self.broadcast.fetch()
+        self.broadcast.publish({'conv': np.zeros((2, 3)), 'quantized': np.zeros(3)})
+        self.assertEqual(weights['conv'][1, 2], 5)
+
+
+class TestReplayBuffer(unittest.TestCase):
+    def test_overwrites_oldest(self):
+        replay_buffer = ReplayBuffer(3, (2,), 4, seed=0)
+        replay_buffer.add(np.arange(10).reshape(5, 2), np.ones((5, 4)), np.arange(5))
+        self.assertEqual(len(replay_buffer), 3)
+        self.assertEqual(sorted(replay_buffer.outcomes), [2, 3, 4])
+        states, action_distributions, outcomes = replay_buffer.sample(8)
+        self.assertEqual(states.shape, (8, 2))
+        self.assertEqual(action_distributions.shape, (8, 4))
+        self.assertTrue(set(outcomes) <= {2, 3, 4})
+
+
+class TestStageCounters(unittest.TestCase):
+    def test_counts(self):
+        counters = StageCounters()
+        counters.add('games')
+        counters.add('positions', 7)
+        result = counters.as_dict()
+        self.assertEqual(result['games'], 1)
+        self.assertEqual(result['positions'], 7)
+        self.assertGreater(result['positions_per_second'], 0)
+
+
+class TestActorLearner(unittest.TestCase):
+    def test_run(self):
+        env = TicTacToeEnv()
+        trainer = ActorLearner(MockTrainableModel, env, n_actors=2, batch_size=8, publish_every=2,
+                               self_play_kwargs={'n_leaf_expansions': 5, 'max_num_turns': 9}, seed=0)
+        counters = trainer.run(n_training_steps=6)
+        self.assertEqual(counters['train_steps'], 6)
+        self.assertEqual(counters['positions_trained'], 48)
+        self.assertEqual(counters['weights_published'], 3)
+        self.assertGreater(counters['games'], 0)
+        # every actor picks up at least the initial weights
+        self.assertGreaterEqual(counters['weight_updates'], 2)
+        self.assertGreaterEqual(counters['positions_received'], 8)
+        self.assertEqual(trainer.model.get_weights()['steps'][0], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
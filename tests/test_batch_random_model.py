@@ -0,0 +1,91 @@
+import copy
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from game import self_play_game, BatchRandomModel
+from mcts import _init_search_worker, _search_worker_context
+from tictactoe_env import TicTacToeEnv
+
+
+class TestBatchRandomModel(unittest.TestCase):
+    def setUp(self):
+        self.env = TicTacToeEnv()
+
+    def test_ttt_with_batch_random_model(self):
+        states, v, pi = self_play_game(BatchRandomModel(self.env),
+                                       self.env,
+                                       n_leaf_expansions=10,
+                                       c_puct=1.0,
+                                       temperature=1,
+                                       max_num_turns=9,
+                                       verbose=False)
+        self.assertGreaterEqual(len(states), 5)
+
+    def test_samples_legal_actions(self):
+        model = BatchRandomModel(self.env, seed=0)
+        state = self.env.reset().copy()
+        state[0, 1, 1] = 1
+        states = np.array([state] * 3)
+        for _ in range(20):
+            action_probs, values = model(states)
+            self.assertEqual(action_probs.shape, (3, self.env.action_size))
+            self.assertEqual(values.shape, (3, 1))
+            for i in range(3):
+                action = np.argmax(action_probs[i])
+                self.assertEqual(action_probs[i].sum(), 1)
+                self.assertIn(action, self.env.get_legal_actions(state))
+
+    def test_rows_without_legal_actions(self):
+        model = BatchRandomModel(self.env)
+        legality_masks = np.zeros((2, self.env.action_size))
+        legality_masks[0, 5] = 1
+        action_probs, values = model.sample(legality_masks)
+        self.assertEqual(action_probs[0, 5], 1)
+        self.assertEqual(action_probs[1].sum(), 0)
+
+    def test_returns_new_arrays(self):
+        model = BatchRandomModel(self.env, seed=0)
+        legality_masks = np.ones((1, self.env.action_size))
+        action_probs, values = model.sample(legality_masks)
+        first_action_probs = action_probs.copy()
+        next_action_probs, next_values = model.sample(legality_masks)
+        self.assertIsNot(next_action_probs, action_probs)
+        self.assertIsNot(next_values, values)
+        np.testing.assert_array_equal(action_probs, first_action_probs)
+
+    def test_shared_between_threads(self):
+        model = BatchRandomModel(self.env, seed=0)
+        errors = []
+
+        def sample_action(action):
+            legality_masks = np.zeros((8, self.env.action_size))
+            legality_masks[:, action] = 1
+            for _ in range(200):
+                action_probs, _ = model.sample(legality_masks)
+                if not np.all(action_probs[:, action] == 1):
+                    errors.append(action)
+
+        threads = [threading.Thread(target=sample_action, args=(action,)) for action in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_search_workers_reseed(self):
+        model = BatchRandomModel(self.env, seed=0)
+        draws = []
+        for pid in (100, 101, 100):
+            with mock.patch('os.getpid', return_value=pid):
+                _init_search_worker(copy.deepcopy(model), self.env, 1234)
+            draws.append(_search_worker_context['model'].random_state.random())
+        _search_worker_context.clear()
+        self.assertNotEqual(draws[0], draws[1])
+        self.assertEqual(draws[0], draws[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import json
+import unittest
+
+from benchmark import parse_thread_setting, run_benchmarks, time_function
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_time_function(self):
+        calls = []
+        result = time_function(lambda: calls.append(1), 5, n_repeats=2)
+        self.assertEqual(len(calls), 10)
+        self.assertEqual(result['n_calls'], 5)
+        self.assertGreater(result['calls_per_second'], 0)
+
+    def test_parse_thread_setting(self):
+        self.assertEqual(parse_thread_setting('4,1'), (4, 1))
+
+    def test_run_benchmarks_is_json(self):
+        report = run_benchmarks(sections=['mcts'], n_repeats=1, n_leaf_expansions=5)
+        names = [result['name'] for result in report['results']]
+        self.assertIn('mcts/tictactoe_random', names)
+        # results must survive a round trip through JSON to be compared between runs
+        self.assertEqual(json.loads(json.dumps(report))['results'][0]['name'], names[0])
@@ -1,17 +1,18 @@
 import unittest
 
 import chess
+import numpy as np
 
 from chess_env import ChessEnv
 
-INITIAL_BLACK_PAWNS_STRING = ('[[ 0.  0.  0.  0.  0.  0.  0.  0.]\n'
-                              ' [ 1.  1.  1.  1.  1.  1.  1.  1.]\n'
-                              ' [ 0.  0.  0.  0.  0.  0.  0.  0.]\n'
-                              ' [ 0.  0.  0.  0.  0.  0.  0.  0.]\n'
-                              ' [ 0.  0.  0.  0.  0.  0.  0.  0.]\n'
-                              ' [ 0.  0.  0.  0.  0.  0.  0.  0.]\n'
-                              ' [ 0.  0.  0.  0.  0.  0.  0.  0.]\n'
-                              ' [ 0.  0.  0.  0.  0.  0.  0.  0.]]')
+INITIAL_BLACK_PAWNS_STRING = ('[[0 0 0 0 0 0 0 0]\n'
+                              ' [1 1 1 1 1 1 1 1]\n'
+                              ' [0 0 0 0 0 0 0 0]\n'
+                              ' [0 0 0 0 0 0 0 0]\n'
+                              ' [0 0 0 0 0 0 0 0]\n'
+                              ' [0 0 0 0 0 0 0 0]\n'
+                              ' [0 0 0 0 0 0 0 0]\n'
+                              ' [0 0 0 0 0 0 0 0]]')
 
 
 class TestChessEnv(unittest.TestCase):
@@ -38,3 +39,63 @@ class TestChessEnv(unittest.TestCase):
         state = self.env.map_board_to_state(board)
         new_board = self.env.map_state_to_board(state)
         self.assertEqual(str(new_board), str(board))
+
+    def test_states_are_uint8(self):
+        state = self.env.reset()
+        self.assertEqual(state.dtype, np.uint8)
+        self.assertEqual(state.nbytes, 8 * 8 * 13)
+
+    def assert_matches_board(self, state):
+        # get_next_state must agree with pushing the move on the equivalent board
+        for action in self.env.get_legal_actions(state):
+            board = self.env.map_state_to_board(state)
+            board.push(self.env.map_action_to_move(state, action))
+            np.testing.assert_array_equal(self.env.get_next_state(state, action),
+                                          self.env.map_board_to_state(board))
+
+    def test_next_state_matches_board(self):
+        rng = np.random.RandomState(0)
+        state = self.env.reset()
+        for _ in range(40):
+            self.assert_matches_board(state)
+            legal_actions = self.env.get_legal_actions(state)
+            state = self.env.get_next_state(state, legal_actions[rng.randint(len(legal_actions))])
+
+    def test_next_state_castling_and_promotion(self):
+        for fen in ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1',
+                    'r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1',
+                    '8/P7/8/8/8/8/8/k6K w - - 0 1'):
+            self.assert_matches_board(self.env.map_board_to_state(chess.Board(fen)))
+
+    def test_promotion_is_one_legal_action(self):
+        state = self.env.map_board_to_state(chess.Board('8/P7/8/8/8/8/8/k6K w - - 0 1'))
+        legal_actions = self.env.get_legal_actions(state)
+        a7, a8 = self.env.position_to_index('a7'), self.env.position_to_index('a8')
+        self.assertEqual(len(legal_actions), len(set(legal_actions)))
+        self.assertEqual(list(legal_actions).count(64 * a7 + a8), 1)
+        self.assertEqual(self.env.get_legality_mask(state).sum(), len(legal_actions))
+
+    def test_castling_moves_rook(self):
+        state = self.env.map_board_to_state(chess.Board('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1'))
+        e1, g1 = self.env.position_to_index('e1'), self.env.position_to_index('g1')
+        board = self.env.map_state_to_board(self.env.get_next_state(state, 64 * e1 + g1))
+        self.assertEqual(str(board.piece_at(chess.F1)), 'R')
+        self.assertIsNone(board.piece_at(chess.H1))
+        self.assertEqual(board.turn, chess.BLACK)
+
+    def test_incremental_hash(self):
+        rng = np.random.RandomState(0)
+        state = self.env.map_board_to_state(chess.Board('r3k2r/pppppppp/8/8/8/8/PPPPPPPP/R3K2R w KQkq - 0 1'))
+        state_hash = self.env.hash_state(state)
+        for _ in range(30):
+            legal_actions = self.env.get_legal_actions(state)
+            state, state_hash = self.env.get_next_state_with_hash(
+                state, state_hash, legal_actions[rng.randint(len(legal_actions))])
+            self.assertEqual(state_hash, self.env.hash_state(state))
+
+    def test_hash_includes_side_to_move(self):
+        white = self.env.map_board_to_state(chess.Board('4k3/8/8/8/8/8/8/4K3 w - - 0 1'))
+        black = self.env.map_board_to_state(chess.Board('4k3/8/8/8/8/8/8/4K3 b - - 0 1'))
+        hashes = self.env.hash_states(np.array([white, black]))
+        self.assertNotEqual(hashes[0], hashes[1])
+        self.assertEqual(int(hashes[0] ^ hashes[1]), self.env.side_to_move_key)
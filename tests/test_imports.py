@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def modules_loaded_by(imports):
+    # a fresh interpreter, so modules imported by other tests don't count
+    code = 'import sys\n{}\nprint(" ".join(sorted(sys.modules)))'.format(imports)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=REPO_DIR)
+    return set(output.decode().split())
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_search_path_does_not_import_tensorflow(self):
+        modules = modules_loaded_by('import game, mcts, ponder, tree, tictactoe_env, kqk_chess_env')
+        self.assertNotIn('tensorflow', modules)
+
+    def test_dual_net_imports_tensorflow_on_first_use(self):
+        modules = modules_loaded_by('import dual_net')
+        self.assertNotIn('tensorflow', modules)
+
+    def test_chess_env_does_not_import_engine_bindings(self):
+        try:
+            import chess  # noqa: F401
+        except ImportError:
+            self.skipTest('python-chess is not installed')
+        modules = modules_loaded_by('import chess_env')
+        self.assertNotIn('tensorflow', modules)
+        self.assertNotIn('chess.uci', modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import multiprocessing
+import threading
+import unittest
+
+import numpy as np
+
+from game import self_play_game
+from inference_server import InferenceServer, RemoteModel, SlotRing
+from tictactoe_env import TicTacToeEnv
+
+from utils import MockTrainableModel
+
+
+def sum_model(states):
+    # the policy repeats each state's sum so results can be matched to their requests
+    sums = states.reshape(len(states), -1).sum(axis=1)
+    return np.repeat(sums[:, None], 3, axis=1), -sums[:, None]
+
+
+def play_remote_game(ring, slot, results):
+    np.random.seed(slot)
+    states, _, _ = self_play_game(RemoteModel(ring, slot), TicTacToeEnv(), n_leaf_expansions=5, max_num_turns=9)
+    results.put(len(states))
+
+
+class TestInferenceServer(unittest.TestCase):
+    def setUp(self):
+        self.ring = SlotRing(4, (2, 2), 3, slot_batch_size=2, input_dtype=np.float32)
+        self.server = InferenceServer(sum_model, self.ring)
+
+    def tearDown(self):
+        self.server.stop()
+        self.ring.close()
+        self.ring.unlink()
+
+    def test_batches_waiting_slots(self):
+        self.ring.inputs[1, :2] = np.ones((2, 2, 2))
+        self.ring.inputs[3, :1] = 2 * np.ones((1, 2, 2))
+        for slot, batch_size in ((1, 2), (3, 1)):
+            self.ring.batch_sizes[slot] = batch_size
+            self.ring.status[slot] = 1
+            self.ring.requests.release()
+        self.assertEqual(self.server.serve_once(timeout=1), 2)
+        self.assertEqual(self.server.n_batches, 1)
+        self.assertEqual(self.server.n_states, 3)
+        np.testing.assert_array_equal(self.ring.values[1, :2, 0], [-4, -4])
+        np.testing.assert_array_equal(self.ring.values[3, :1, 0], [-8])
+        self.assertTrue(self.ring.done[1].acquire(block=False))
+        self.assertTrue(self.ring.done[3].acquire(block=False))
+        self.assertEqual(self.server.serve_once(timeout=0.01), 0)
+
+    def test_remote_model_threads(self):
+        self.server.start()
+        errors = []
+
+        def client(slot):
+            for i in range(20):
+                states = np.full((2, 2, 2), slot * 100 + i)
+                policy, value = RemoteModel(self.ring, slot)(states)
+                if not np.all(value == -4 * (slot * 100 + i)):
+                    errors.append((slot, i))
+        threads = [threading.Thread(target=client, args=(slot,)) for slot in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.server.n_states, 4 * 20 * 2)
+
+    def test_too_many_states(self):
+        with self.assertRaises(ValueError):
+            RemoteModel(self.ring, 0)(np.zeros((3, 2, 2)))
+
+
+class TestRemoteSelfPlay(unittest.TestCase):
+    def test_worker_processes(self):
+        env = TicTacToeEnv()
+        context = multiprocessing.get_context('spawn')
+        ring = SlotRing(2, env.input_shape, env.action_size, input_dtype=env.state_dtype, context=context)
+        server = InferenceServer(MockTrainableModel(env), ring)
+        server.start()
+        results = context.Queue()
+        workers = [context.Process(target=play_remote_game, args=(ring, slot, results)) for slot in range(2)]
+        try:
+            for worker in workers:
+                worker.start()
+            n_positions = [results.get(timeout=60) for _ in workers]
+            for worker in workers:
+                worker.join()
+        finally:
+            server.stop()
+            ring.close()
+            ring.unlink()
+        self.assertTrue(all(n > 0 for n in n_positions))
+        self.assertGreater(server.n_batches, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
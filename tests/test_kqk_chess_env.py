@@ -64,3 +64,78 @@ class TestKQKChessEnv(unittest.TestCase):
         recovered_action = self.env.convert_int_to_action(action_int)
         self.assertEqual(type(action_int), np.int64)
         self.assertEqual(action[3, 3, 4, 4, 2], recovered_action[3, 3, 4, 4, 2])
+
+    def test_states_are_uint8(self):
+        start_state = np.zeros((8, 8, 4), dtype=np.uint8)
+        start_state[0, 2, 0] = 1
+        start_state[2, 0, 1] = 1
+        start_state[3, 3, 2] = 1
+        start_state[:, :, 3] = 1
+        action = self.env.get_legal_actions(start_state)[0]
+        next_state = self.env.get_next_state(start_state, action)
+        self.assertEqual(next_state.dtype, np.uint8)
+        self.assertEqual(next_state[:, :, 3].sum(), 0)
+
+    def test_next_state_matches_board(self):
+        start_state = np.zeros((8, 8, 4), dtype=np.uint8)
+        start_state[0, 2, 0] = 1
+        start_state[2, 0, 1] = 1
+        start_state[3, 3, 2] = 1
+        start_state[:, :, 3] = 1
+        rng = np.random.RandomState(0)
+        state = start_state
+        for _ in range(20):
+            if self.env.is_game_over(state):
+                break
+            legal_actions = self.env.get_legal_actions(state)
+            for action in legal_actions:
+                board = self.env.map_state_to_board(state)
+                board.push(self.env.map_action_to_move(state, action))
+                np.testing.assert_array_equal(self.env.get_next_state(state, action),
+                                              self.env.map_board_to_state(board))
+            state = self.env.get_next_state(state, legal_actions[rng.randint(len(legal_actions))])
+
+    def test_king_captures_queen(self):
+        state = np.zeros((8, 8, 4), dtype=np.uint8)
+        state[0, 0, 0] = 1
+        state[4, 4, 1] = 1
+        state[4, 5, 2] = 1
+        # black to move, the queen on e5 is next to the black king and unprotected
+        action = int(np.ravel_multi_index((4, 5, 4, 4, 2), self.env.action_dims))
+        next_state = self.env.get_next_state(state, action)
+        self.assertEqual(next_state[:, :, 1].sum(), 0)
+        self.assertEqual(next_state[4, 4, 2], 1)
+        self.assertEqual(next_state[4, 5, 2], 0)
+        self.assertEqual(next_state[0, 0, 3], 1)
+
+    def test_incremental_hash(self):
+        state = np.zeros((8, 8, 4), dtype=np.uint8)
+        state[0, 2, 0] = 1
+        state[2, 0, 1] = 1
+        state[3, 3, 2] = 1
+        state[:, :, 3] = 1
+        state_hash = self.env.hash_state(state)
+        rng = np.random.RandomState(0)
+        for _ in range(20):
+            if self.env.is_game_over(state):
+                break
+            legal_actions = self.env.get_legal_actions(state)
+            state, state_hash = self.env.get_next_state_with_hash(
+                state, state_hash, legal_actions[rng.randint(len(legal_actions))])
+            self.assertEqual(state_hash, self.env.hash_state(state))
+            self.assertEqual(int(self.env.hash_states(state[None])[0]), state_hash)
+
+    def test_legality_mask_matches_legal_actions(self):
+        state = np.zeros((8, 8, 4), dtype=np.uint8)
+        state[0, 2, 0] = 1
+        state[2, 0, 1] = 1
+        state[3, 3, 2] = 1
+        state[:, :, 3] = 1
+        for action_regime in ('KQK_pos_pos_piece', 'KQK_pos_pos'):
+            env = KQKChessEnv('KQK_conv', action_regime)
+            legal_actions = env.get_legal_actions(state)
+            self.assertEqual(sorted(np.flatnonzero(env.get_legality_mask(state))), sorted(legal_actions))
+            for action in legal_actions:
+                board = env.map_state_to_board(state)
+                self.assertEqual(env.map_move_to_action(board, env.map_action_to_move(state, action)), action)
+
@@ -1,16 +1,33 @@
 from functools import partial
+import threading
+import time
 import unittest
+from unittest import mock
+
+import numpy as np
 
 from mcts import (backup,
                   select,
                   expand_node,
+                  evaluate_state,
                   exploration_bonus_for_c_puct,
                   perform_rollouts,
                   get_action_distribution,
-                  get_next_state_with_mcts)
-from tree import Node
-
-from utils import setup_simple_tree, mock_model, mock_env, numline_env, mock_model_numline
+                  get_next_state_with_mcts,
+                  commit_move,
+                  get_child_node,
+                  evict_subtrees,
+                  is_search_settled,
+                  root_parallel_visit_counts,
+                  make_search_pool,
+                  split_rollouts)
+from game import BatchRandomModel
+from search_callbacks import SearchCallback
+from search_stats import SearchStats
+from tictactoe_env import TicTacToeEnv
+from tree import Node, NodePool, count_nodes, create_new_connection
+
+from utils import setup_simple_tree, setup_visited_tree, mock_model_one_sided, slow_mock_model_numline, mock_model, mock_env, numline_env, mock_model_numline
 
 
 class TestMCTS(unittest.TestCase):
@@ -74,8 +91,38 @@ class TestMCTS(unittest.TestCase):
         value = expand_node(self.nodes[6], mock_model, mock_env)
         self.assertEqual(value, 1)
         self.assertEqual(len(self.nodes[6].outgoing_edges), 2)
-        next_states = [edge.out_node.state for edge in self.nodes[6].outgoing_edges]
-        self.assertTrue(set(next_states), set([13, 14]))
+        # children are not created until an edge is followed
+        self.assertEqual([edge.out_node for edge in self.nodes[6].outgoing_edges], [None, None])
+        next_states = [get_child_node(edge, mock_env).state for edge in self.nodes[6].outgoing_edges]
+        self.assertEqual(set(next_states), set([13, 14]))
+        self.assertIs(self.nodes[6].outgoing_edges[0].out_node.in_edge, self.nodes[6].outgoing_edges[0])
+
+    def test_get_child_node_once(self):
+        calls = []
+
+        class CountingEnv(object):
+            def get_next_state(self, state, action):
+                calls.append((state, action))
+                return mock_env.get_next_state(state, action)
+
+        expand_node(self.nodes[6], mock_model, mock_env)
+        edge = self.nodes[6].outgoing_edges[1]
+        child = get_child_node(edge, CountingEnv())
+        self.assertIs(get_child_node(edge, CountingEnv()), child)
+        self.assertEqual(calls, [(6, 1)])
+
+    def test_child_hashes(self):
+        env = TicTacToeEnv()
+        root_node = Node(env.reset())
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=1.0)
+        perform_rollouts(root_node, 50, BatchRandomModel(env, seed=0), env, exploration_bonus)
+        stack = [root_node]
+        while stack:
+            node = stack.pop()
+            self.assertEqual(node.state_hash, env.hash_state(node.state))
+            stack.extend(edge.out_node for edge in node.outgoing_edges if edge.out_node is not None)
+        next_node = commit_move(Node(env.reset()), 4, env)[0]
+        self.assertEqual(next_node.state_hash, env.hash_state(next_node.state))
 
 
 class TestRollouts(unittest.TestCase):
@@ -158,3 +205,325 @@ class TestRollouts(unittest.TestCase):
         potential_third_node = second_node.outgoing_edges[0].out_node
 
         self.assertEqual(len(potential_third_node.outgoing_edges), 2)
+
+    def test_commit_move_prunes_siblings(self):
+        n_leaf_expansions = 30
+        c = 100
+        root_node = Node(0)
+        pool = NodePool()
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c)
+        perform_rollouts(root_node, n_leaf_expansions, mock_model_numline, numline_env, exploration_bonus, pool)
+        tree_size = count_nodes(root_node)
+        child_size = count_nodes(root_node.outgoing_edges[1].out_node)
+        child_visits = root_node.outgoing_edges[1].num_visits
+
+        next_node, num_kept, num_freed = commit_move(root_node, 1, numline_env, pool)
+
+        self.assertEqual(next_node.state, 1)
+        self.assertIsNone(next_node.in_edge)
+        self.assertEqual(num_kept, child_size)
+        self.assertEqual(num_kept + num_freed, tree_size)
+        self.assertEqual(len(pool), num_freed)
+        # search statistics below the new root are kept
+        self.assertEqual(sum(edge.num_visits for edge in next_node.outgoing_edges), child_visits - 1)
+
+    def test_commit_move_unexpanded_root(self):
+        next_node, num_kept, num_freed = commit_move(Node(0), 1, numline_env)
+        self.assertEqual(next_node.state, 1)
+        self.assertEqual((num_kept, num_freed), (1, 1))
+
+    def test_rollouts_with_node_budget(self):
+        root_node = Node(0)
+        max_nodes = 20
+        n_leaf_expansions = 100
+        c = 100
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c)
+        perform_rollouts(root_node, n_leaf_expansions, mock_model_numline, numline_env, exploration_bonus,
+                         max_nodes=max_nodes)
+        self.assertLessEqual(count_nodes(root_node), max_nodes)
+        # statistics of collapsed subtrees are kept on the edges
+        self.assertEqual(sum(edge.num_visits for edge in root_node.outgoing_edges), n_leaf_expansions)
+
+
+class TestEviction(unittest.TestCase):
+    def test_evicts_least_visited_subtree(self):
+        #      0
+        #   1     2
+        #  3 4   5 6
+        nodes = setup_visited_tree()
+        num_freed = evict_subtrees(nodes[0], 1)
+        self.assertEqual(num_freed, 2)
+        # node 2 has fewer visits than node 1, so it is collapsed
+        self.assertEqual(count_nodes(nodes[0]), 5)
+        self.assertFalse(nodes[2].is_expanded)
+        self.assertEqual(nodes[2].in_edge.num_visits, 2)
+        self.assertEqual(nodes[2].in_edge.total_action_value, 1.0)
+        self.assertTrue(nodes[1].is_expanded)
+
+    def test_skips_pinned_nodes(self):
+        nodes = setup_visited_tree()
+        # node 2 has the fewest visits, but a rollout is evaluating its child node 5
+        num_freed = evict_subtrees(nodes[0], 1, pinned={nodes[2]: 1, nodes[5]: 1})
+        self.assertEqual(num_freed, 2)
+        self.assertTrue(nodes[2].is_expanded)
+        self.assertFalse(nodes[1].is_expanded)
+
+    def test_keeps_priors_of_nodes_without_created_children(self):
+        nodes = setup_visited_tree()
+        for node in nodes[3:]:
+            node.is_expanded = True
+            create_new_connection(node, None, 0, 1.0)
+        for node in nodes[1:3]:
+            for edge in node.outgoing_edges:
+                edge.num_visits = 1
+        evict_subtrees(nodes[0], 1)
+        # nodes 3 to 6 have the fewest visits, but collapsing them would free nothing
+        self.assertFalse(nodes[2].is_expanded)
+        self.assertTrue(all(node.is_expanded for node in nodes[3:5]))
+
+
+class TestAnytimeSearch(unittest.TestCase):
+    def test_is_search_settled(self):
+        nodes = setup_visited_tree()
+        # visit counts at the root are 5 and 2
+        self.assertTrue(is_search_settled(nodes[0], 2))
+        self.assertFalse(is_search_settled(nodes[0], 3))
+
+    def test_time_budget(self):
+        root_node = Node(0)
+        c = 100
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c)
+        n_performed = perform_rollouts(root_node, None, mock_model_numline, numline_env, exploration_bonus,
+                                       time_budget=0.05)
+        self.assertGreater(n_performed, 0)
+        self.assertEqual(sum(edge.num_visits for edge in root_node.outgoing_edges), n_performed)
+
+    def test_requires_a_budget(self):
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=100)
+        with self.assertRaises(ValueError):
+            perform_rollouts(Node(0), None, mock_model_numline, numline_env, exploration_bonus, early_stopping=True)
+
+    def test_early_stopping(self):
+        root_node = Node(0)
+        n_leaf_expansions = 100
+        c = 1
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c)
+        n_performed = perform_rollouts(root_node, n_leaf_expansions, mock_model_one_sided, numline_env,
+                                       exploration_bonus, early_stopping=True)
+        self.assertLess(n_performed, n_leaf_expansions)
+        edge0, edge1 = root_node.outgoing_edges
+        self.assertGreater(edge1.num_visits - edge0.num_visits, n_leaf_expansions - n_performed)
+
+    def test_early_stopping_distribution(self):
+        distribution = get_action_distribution(Node(0), 1, 100, mock_model_one_sided, numline_env, 1,
+                                               early_stopping=True)
+        self.assertAlmostEqual(distribution.sum(), 1.0)
+        self.assertEqual(np.argmax(distribution), 1)
+
+
+class TestThreadedRollouts(unittest.TestCase):
+    def assert_consistent_visits(self, node):
+        # at most every visit to a node's in edge except the one that expanded it went on to a child.
+        # threads that evaluated the same leaf at once only count at that leaf.
+        for edge in node.outgoing_edges:
+            if edge.out_node is not None and edge.out_node.outgoing_edges:
+                child_visits = sum(child_edge.num_visits for child_edge in edge.out_node.outgoing_edges)
+                self.assertLessEqual(child_visits, edge.num_visits - 1)
+                self.assert_consistent_visits(edge.out_node)
+
+    def test_threaded_rollouts(self):
+        root_node = Node(0)
+        n_leaf_expansions = 50
+        c = 100
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c)
+        n_performed = perform_rollouts(root_node, n_leaf_expansions, slow_mock_model_numline, numline_env,
+                                       exploration_bonus, n_threads=4)
+        self.assertEqual(n_performed, n_leaf_expansions)
+        self.assertEqual(sum(edge.num_visits for edge in root_node.outgoing_edges), n_leaf_expansions)
+        self.assert_consistent_visits(root_node)
+
+    def test_threaded_rollouts_with_node_budget(self):
+        root_node = Node(0)
+        max_nodes = 10
+        c = 100
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=c)
+        n_performed = perform_rollouts(root_node, 50, slow_mock_model_numline, numline_env, exploration_bonus,
+                                       NodePool(), max_nodes, n_threads=4)
+        self.assertEqual(sum(edge.num_visits for edge in root_node.outgoing_edges), n_performed)
+        self.assertLessEqual(count_nodes(root_node), max_nodes)
+
+    def test_eviction_spares_leaves_being_evaluated(self):
+        # the env sees each leaf's state before the model does.  if the leaf were evicted and
+        # its node recycled in between, the model would be given some other state
+        env_states = threading.local()
+        mismatches = []
+
+        class SlowEnv(object):
+            def __getattr__(self, name):
+                return getattr(numline_env, name)
+
+            def get_legal_actions(self, state):
+                env_states.state = state
+                time.sleep(0.001)
+                return numline_env.get_legal_actions(state)
+
+        def checking_model(states):
+            if states[0] != env_states.state:
+                mismatches.append((env_states.state, states[0]))
+            return slow_mock_model_numline(states)
+
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=100)
+        perform_rollouts(Node(0), 200, checking_model, SlowEnv(), exploration_bonus, NodePool(), 4, n_threads=4)
+        self.assertEqual(mismatches, [])
+
+    def test_thread_errors_are_raised(self):
+        def broken_model(states):
+            raise ValueError('broken')
+
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=1)
+        root_node = Node(0)
+        expand_node(root_node, mock_model_numline, numline_env)
+        with self.assertRaises(ValueError):
+            perform_rollouts(root_node, 10, broken_model, numline_env, exploration_bonus, n_threads=2)
+
+
+class TestRootParallel(unittest.TestCase):
+    def test_root_parallel_visit_counts(self):
+        root_node = Node(0)
+        visit_counts = root_parallel_visit_counts(root_node, 20, mock_model_numline, numline_env, 100, 2)
+        self.assertEqual(visit_counts.shape, (numline_env.action_size,))
+        self.assertEqual(visit_counts.sum(), 20)
+        # searches run in the pool, the tree passed in is left alone
+        self.assertFalse(root_node.is_expanded)
+
+    def test_split_rollouts(self):
+        self.assertEqual(split_rollouts(21, 4), [6, 5, 5, 5])
+        self.assertEqual(split_rollouts(20, 4), [5, 5, 5, 5])
+        self.assertEqual(split_rollouts(2, 4), [1, 1])
+        self.assertEqual(split_rollouts(None, 2), [None, None])
+
+    def test_uneven_split_does_exact_rollouts(self):
+        visit_counts = root_parallel_visit_counts(Node(0), 21, mock_model_numline, numline_env, 100, 4)
+        self.assertEqual(visit_counts.sum(), 21)
+
+    def test_reuses_pool(self):
+        with make_search_pool(2, mock_model_numline, numline_env) as pool:
+            for _ in range(3):
+                visit_counts = root_parallel_visit_counts(Node(0), 11, mock_model_numline, numline_env, 100, 2,
+                                                          pool=pool)
+                self.assertEqual(visit_counts.sum(), 11)
+
+    def test_root_parallel_distribution(self):
+        root_node = Node(0)
+        distribution = get_action_distribution(root_node, 1, 20, mock_model_numline, numline_env, 100,
+                                               n_processes=2)
+        self.assertEqual(distribution.shape, (numline_env.action_size,))
+        self.assertAlmostEqual(distribution.sum(), 1.0)
+
+        next_node, _ = get_next_state_with_mcts(root_node, 1, 20, mock_model_numline, numline_env, 100,
+                                                n_processes=2)
+        self.assertIn(next_node.state, (-1, 1))
+
+
+class TestSearchStats(unittest.TestCase):
+    def test_rollout_stats(self):
+        root_node = Node(0)
+        n_leaf_expansions = 20
+        stats = SearchStats()
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=100)
+        perform_rollouts(root_node, n_leaf_expansions, mock_model_numline, numline_env, exploration_bonus,
+                         stats=stats)
+        self.assertEqual(stats.n_rollouts, n_leaf_expansions)
+        self.assertEqual(stats.select_calls, n_leaf_expansions)
+        self.assertEqual(stats.backup_calls, n_leaf_expansions)
+        # the root is expanded before the rollouts start
+        self.assertEqual(stats.model_calls, n_leaf_expansions + 1)
+        self.assertEqual(stats.batch_sizes, {1: n_leaf_expansions + 1})
+        self.assertEqual(stats.tree_size, count_nodes(root_node))
+        self.assertGreaterEqual(stats.average_selection_depth, 1)
+        self.assertGreater(stats.nodes_per_second, 0)
+        self.assertGreater(stats.env_calls, 0)
+
+    def test_get_action_distribution_returns_stats(self):
+        distribution, stats = get_action_distribution(Node(0), 1, 10, mock_model_numline, numline_env, 100,
+                                                      return_stats=True)
+        self.assertAlmostEqual(distribution.sum(), 1.0)
+        self.assertEqual(stats.n_rollouts, 10)
+        self.assertEqual(stats.as_dict()['n_rollouts'], 10)
+
+
+class LegalPriorModel(object):
+    # a model that only gives priors for the legal actions, like DualNet.predict_legal
+    def __init__(self):
+        self.legal_actions_seen = []
+
+    def __call__(self, states):
+        raise AssertionError('the dense policy should not be asked for')
+
+    def predict_legal(self, states, legal_actions=None):
+        self.legal_actions_seen.extend(legal_actions)
+        priors = [np.linspace(1, 2, len(actions)) / np.linspace(1, 2, len(actions)).sum() for actions in legal_actions]
+        return priors, np.ones((len(states), 1))
+
+
+class TestLegalPriors(unittest.TestCase):
+    def test_expand_node_uses_legal_priors(self):
+        model = LegalPriorModel()
+        node = Node(0)
+        value = expand_node(node, model, numline_env)
+        self.assertEqual(value, 1)
+        self.assertEqual(len(model.legal_actions_seen), 1)
+        self.assertEqual(list(model.legal_actions_seen[0]), list(numline_env.get_legal_actions(0)))
+        self.assertEqual([edge.action for edge in node.outgoing_edges], [0, 1])
+        np.testing.assert_allclose([edge.prior_probability for edge in node.outgoing_edges], [1 / 3, 2 / 3])
+
+    def test_rollouts_with_stats(self):
+        stats = SearchStats()
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=100)
+        perform_rollouts(Node(0), 10, LegalPriorModel(), numline_env, exploration_bonus, stats=stats)
+        self.assertEqual(stats.model_calls, 11)
+
+
+class RecordingCallback(SearchCallback):
+    def __init__(self):
+        self.events = []
+
+    def on_leaf_selected(self, path, elapsed):
+        self.events.append(('selected', path[-1].out_node.state))
+
+    def on_node_expanded(self, node, model_time):
+        self.events.append(('expanded', node.state))
+
+    def on_backup_complete(self, node, value, elapsed):
+        self.events.append(('backup', node.state))
+
+    def on_search_complete(self, root_node, n_rollouts, elapsed):
+        self.events.append(('complete', n_rollouts))
+
+
+class TestSearchCallbacks(unittest.TestCase):
+    def test_callback_order(self):
+        callback = RecordingCallback()
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=100)
+        perform_rollouts(Node(0), 2, mock_model, mock_env, exploration_bonus, callbacks=[callback])
+        self.assertEqual(callback.events, [('expanded', 0),
+                                           ('selected', 2), ('expanded', 2), ('backup', 2),
+                                           ('selected', 1), ('expanded', 1), ('backup', 1),
+                                           ('complete', 2)])
+
+    def test_model_is_only_timed_with_callbacks(self):
+        _, _, _, model_time = evaluate_state(0, slow_mock_model_numline, numline_env)
+        self.assertEqual(model_time, 0.0)
+        _, _, _, model_time = evaluate_state(0, slow_mock_model_numline, numline_env, timed=True)
+        self.assertGreater(model_time, 0.0)
+
+        exploration_bonus = partial(exploration_bonus_for_c_puct, c_puct=100)
+        with mock.patch('mcts.time.perf_counter', wraps=time.perf_counter) as perf_counter:
+            perform_rollouts(Node(0), 10, mock_model_numline, numline_env, exploration_bonus)
+        # only the start and end of the search are timed
+        self.assertEqual(perf_counter.call_count, 2)
+
+    def test_expand_node_callback(self):
+        callback = RecordingCallback()
+        expand_node(Node(6), mock_model, mock_env, [callback])
+        self.assertEqual(callback.events, [('expanded', 6)])
@@ -1,3 +1,6 @@
+import os
+import tempfile
+import threading
 import unittest
 import tensorflow as tf
 import numpy as np
@@ -5,6 +8,9 @@ import chess
 
 from dual_net import (
     DualNet,
+    FrozenDualNet,
+    ReadWriteLock,
+    make_session,
     )
 
 from chess_env import (
@@ -179,5 +185,205 @@ class TestPrediction(unittest.TestCase):
         self.assertEqual(value_diff.shape, (10, 1))
 
 
+class KQKGraphTestCase(unittest.TestCase):
+    # KQK states in a fresh graph and session for every test
+    def setUp(self):
+        self.env = KQKChessEnv('KQK_conv', 'KQK_pos_pos')
+        board = chess.Board()
+        board.set_piece_map({0: chess.Piece.from_symbol('K'), 8: chess.Piece.from_symbol('Q'), 41: chess.Piece.from_symbol('k')})
+        self.states = np.array([self.env.map_board_to_state(board) for _ in range(4)])
+        self.graph = tf.Graph()
+        self.graph_context = self.graph.as_default()
+        self.graph_context.__enter__()
+        self.sess = tf.Session(graph=self.graph)
+
+    def tearDown(self):
+        self.sess.close()
+        self.graph_context.__exit__(None, None, None)
+
+
+class TestInferenceOnly(KQKGraphTestCase):
+    def test_no_training_ops(self):
+        net = DualNet(self.sess, self.env, num_convolutional_filters=8, inference_only=True)
+        self.sess.run(tf.global_variables_initializer())
+        self.assertFalse(hasattr(net, 'loss'))
+        policy, value = net(self.states)
+        self.assertEqual(policy.shape, (4, 64*64))
+        with self.assertRaises(ValueError):
+            net.train(self.states, policy, value[:, 0])
+
+    def test_predict_legal_matches_dense(self):
+        net = DualNet(self.sess, self.env, num_convolutional_filters=8, inference_only=True)
+        self.sess.run(tf.global_variables_initializer())
+        policy, value = net(self.states)
+        legal_actions = [self.env.get_legal_actions(state) for state in self.states]
+        priors, legal_value = net.predict_legal(self.states)
+        self.assertEqual(len(priors), len(self.states))
+        for i in range(len(self.states)):
+            self.assertEqual(len(priors[i]), len(legal_actions[i]))
+            np.testing.assert_allclose(priors[i], policy[i][legal_actions[i]], rtol=1e-5)
+        np.testing.assert_allclose(legal_value, value)
+
+    def test_nets_have_separate_variables(self):
+        net = DualNet(self.sess, self.env, num_convolutional_filters=8)
+        other_net = DualNet(self.sess, self.env, num_convolutional_filters=8)
+        self.assertNotEqual(net.scope, other_net.scope)
+        self.assertEqual(len(net.trainable_variables()), len(other_net.trainable_variables()))
+        self.assertFalse(set(net.trainable_variables()) & set(other_net.trainable_variables()))
+
+    def test_frozen_graph_matches(self):
+        net = DualNet(self.sess, self.env, num_convolutional_filters=8)
+        self.sess.run(tf.global_variables_initializer())
+        # a few training steps so the batch normalizations are not the identity
+        pi = np.random.random_sample([4, 64*64])
+        for _ in range(3):
+            net.train(self.states, pi, np.ones(4))
+        policy, value = net(self.states)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'frozen.pb')
+            net.export_frozen_graph(path)
+            frozen_net = FrozenDualNet(path, self.env)
+            frozen_policy, frozen_value = frozen_net(self.states)
+            frozen_net.close()
+        np.testing.assert_allclose(frozen_policy, policy, atol=1e-5)
+        np.testing.assert_allclose(frozen_value, value, atol=1e-5)
+        # the batch normalizations are folded into the convolutions
+        op_types = set(op.type for op in frozen_net.graph.get_operations())
+        self.assertFalse(op_types & {'FusedBatchNorm', 'FusedBatchNormV3'})
+
+    def test_policy_with_large_logits(self):
+        net = DualNet(self.sess, self.env, num_convolutional_filters=8, inference_only=True)
+        self.sess.run(tf.global_variables_initializer())
+        # scaling up the policy head's last layer makes exp overflow without the max subtraction
+        weights = net.get_weights()
+        for name in weights:
+            if weights[name].shape[-1] == self.env.action_size:
+                weights[name] = weights[name] * 1e4
+        net.set_weights(weights)
+        policy, value = net(self.states)
+        self.assertTrue(np.all(np.isfinite(policy)))
+        np.testing.assert_allclose(policy.sum(axis=1), 1, rtol=1e-5)
+
+
+class TestWeights(KQKGraphTestCase):
+    def setUp(self):
+        super(TestWeights, self).setUp()
+        self.net = DualNet(self.sess, self.env, num_convolutional_filters=8)
+        self.sess.run(tf.global_variables_initializer())
+        self.pi = np.random.random_sample([4, 64*64])
+
+    def train_steps(self, n_steps=3):
+        for _ in range(n_steps):
+            self.net.train(self.states, self.pi, np.ones(4))
+
+    def test_save_restore(self):
+        policy, value = self.net(self.states)
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.net.save(os.path.join(directory, 'model.ckpt'))
+            self.train_steps()
+            self.assertFalse(np.allclose(self.net(self.states)[1], value))
+            self.net.restore(path)
+        restored_policy, restored_value = self.net(self.states)
+        np.testing.assert_allclose(restored_policy, policy)
+        np.testing.assert_allclose(restored_value, value)
+
+    def test_restore_into_inference_net(self):
+        self.train_steps()
+        policy, value = self.net(self.states)
+        actor = DualNet(self.sess, self.env, num_convolutional_filters=8, inference_only=True)
+        self.sess.run(tf.variables_initializer(actor.model_variables()))
+        with tempfile.TemporaryDirectory() as directory:
+            actor.restore(self.net.save(os.path.join(directory, 'model.ckpt')))
+        actor_policy, actor_value = actor(self.states)
+        np.testing.assert_allclose(actor_policy, policy, atol=1e-6)
+        np.testing.assert_allclose(actor_value, value, atol=1e-6)
+
+    def test_set_weights(self):
+        actor = DualNet(self.sess, self.env, num_convolutional_filters=8, inference_only=True)
+        self.sess.run(tf.variables_initializer(actor.model_variables()))
+        self.train_steps()
+        weights = self.net.get_weights()
+        self.assertEqual(set(weights), set(actor.get_weights()))
+        actor.set_weights(weights)
+        n_ops = len(self.graph.get_operations())
+        # swapping again only feeds new values
+        actor.set_weights(weights)
+        self.assertEqual(len(self.graph.get_operations()), n_ops)
+        np.testing.assert_allclose(actor(self.states)[1], self.net(self.states)[1], atol=1e-6)
+
+    def test_set_weights_missing(self):
+        weights = self.net.get_weights()
+        weights.pop(sorted(weights)[0])
+        with self.assertRaises(ValueError):
+            self.net.set_weights(weights)
+
+    def test_forward_passes_run_concurrently(self):
+        # a forward pass doesn't wait for another one holding the lock
+        done = threading.Event()
+        thread = threading.Thread(target=lambda: (self.net(self.states), done.set()))
+        with self.net._lock.shared():
+            thread.start()
+            self.assertTrue(done.wait(timeout=30))
+        thread.join()
+
+
+class TestReadWriteLock(unittest.TestCase):
+    def setUp(self):
+        self.lock = ReadWriteLock()
+
+    def hold_in_thread(self, acquire):
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with acquire():
+                acquired.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        return thread, acquired, release
+
+    def test_readers_share(self):
+        thread, acquired, release = self.hold_in_thread(self.lock.shared)
+        self.assertTrue(acquired.wait(timeout=5))
+        with self.lock.shared():
+            pass
+        release.set()
+        thread.join()
+
+    def test_writer_waits_for_readers(self):
+        with self.lock.shared():
+            thread, acquired, release = self.hold_in_thread(self.lock.exclusive)
+            self.assertFalse(acquired.wait(timeout=0.05))
+        self.assertTrue(acquired.wait(timeout=5))
+        release.set()
+        thread.join()
+
+    def test_waiting_writer_keeps_readers_out(self):
+        with self.lock.shared():
+            writer, writer_acquired, writer_release = self.hold_in_thread(self.lock.exclusive)
+            self.assertFalse(writer_acquired.wait(timeout=0.05))
+            reader, reader_acquired, reader_release = self.hold_in_thread(self.lock.shared)
+            self.assertFalse(reader_acquired.wait(timeout=0.05))
+        self.assertTrue(writer_acquired.wait(timeout=5))
+        self.assertFalse(reader_acquired.is_set())
+        writer_release.set()
+        self.assertTrue(reader_acquired.wait(timeout=5))
+        reader_release.set()
+        writer.join()
+        reader.join()
+
+
+class TestSessions(KQKGraphTestCase):
+    def test_make_session(self):
+        sess = make_session(intra_op_threads=1, inter_op_threads=1, use_gpu=False, graph=self.graph)
+        net = DualNet(sess, self.env, num_convolutional_filters=8, inference_only=True, device='/cpu:0')
+        sess.run(tf.global_variables_initializer())
+        policy, value = net(self.states)
+        self.assertEqual(policy.shape, (4, 64*64))
+        sess.close()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from perf_regression import compare_to_baseline, run_workload
+
+
+class TestPerfRegression(unittest.TestCase):
+    def setUp(self):
+        self.baseline = {'nodes_per_second': 1000.0, 'positions_per_second': 50.0}
+
+    def test_within_threshold(self):
+        metrics = {'nodes_per_second': 850.0, 'positions_per_second': 45.0}
+        self.assertEqual(compare_to_baseline(metrics, self.baseline, 0.2), [])
+
+    def test_regression(self):
+        metrics = {'nodes_per_second': 700.0, 'positions_per_second': 55.0}
+        regressions = compare_to_baseline(metrics, self.baseline, 0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('nodes_per_second', regressions[0])
+
+    def test_workload_is_deterministic(self):
+        first = run_workload(n_games=3, n_leaf_expansions=5, n_repeats=1)
+        second = run_workload(n_games=3, n_leaf_expansions=5, n_repeats=1)
+        self.assertEqual(first['n_positions'], second['n_positions'])
+        self.assertGreater(first['peak_rss_mb'], 0)
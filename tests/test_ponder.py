@@ -0,0 +1,56 @@
+import time
+import unittest
+from unittest import mock
+
+from ponder import Ponderer
+from tree import Node, count_nodes
+
+from utils import numline_env, slow_mock_model_numline
+
+
+class TestPonderer(unittest.TestCase):
+    def setUp(self):
+        self.ponderer = Ponderer(slow_mock_model_numline, numline_env, c_puct=100)
+
+    def test_ponder_then_follow_opponent_move(self):
+        root_node = Node(0)
+        self.ponderer.start(root_node)
+        self.assertTrue(self.ponderer.is_pondering)
+        time.sleep(0.05)
+        next_node = self.ponderer.stop(1)
+
+        self.assertFalse(self.ponderer.is_pondering)
+        self.assertGreater(self.ponderer.n_rollouts, 0)
+        self.assertEqual(next_node.state, 1)
+        self.assertIsNone(next_node.in_edge)
+        # the search done while pondering is kept below the opponent's move
+        self.assertTrue(next_node.is_expanded)
+
+    def test_stop_without_move(self):
+        root_node = Node(0)
+        self.ponderer.start(root_node)
+        time.sleep(0.02)
+        self.assertIs(self.ponderer.stop(), root_node)
+        self.assertEqual(sum(edge.num_visits for edge in root_node.outgoing_edges), self.ponderer.n_rollouts)
+
+    def test_start_twice(self):
+        self.ponderer.start(Node(0))
+        with self.assertRaises(RuntimeError):
+            self.ponderer.start(Node(0))
+        self.ponderer.stop()
+
+    def test_stop_without_start(self):
+        self.assertIsNone(self.ponderer.stop())
+        self.assertIsNone(self.ponderer.stop(1))
+
+    def test_ponder_with_node_budget(self):
+        ponderer = Ponderer(slow_mock_model_numline, numline_env, c_puct=100, max_nodes=10)
+        root_node = Node(0)
+        with mock.patch('mcts.count_nodes', wraps=count_nodes) as counted:
+            ponderer.start(root_node)
+            time.sleep(0.05)
+            ponderer.stop()
+        self.assertGreater(ponderer.n_rollouts, 1)
+        # the tree is counted when the search starts, not after every rollout
+        self.assertEqual(counted.call_count, 1)
+        self.assertLessEqual(count_nodes(root_node), 10)
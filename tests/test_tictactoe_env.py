@@ -48,6 +48,13 @@ class TestTicTacToeEnv(unittest.TestCase):
         self.assertTrue(np.array_equal(true_next_state, next_state))
         self.assertEqual(len(self.env.get_legal_actions(next_state)), 7)
 
+    def test_legality_mask(self):
+        state = np.zeros((2, 3, 3), dtype=int)
+        state[0, 1, 1] = 1
+        mask = self.env.get_legality_mask(state)
+        self.assertEqual(mask.shape, (self.env.action_size,))
+        self.assertEqual(set(np.flatnonzero(mask)), set(self.env.get_legal_actions(state)))
+
     def test_x_win(self):
         start_state = np.zeros((2, 3, 3), dtype=int)
 
@@ -166,3 +173,25 @@ class TestTicTacToeEnv(unittest.TestCase):
 
         state[0, 0, 0] = 1
         self.assertFalse(self.env.is_x_turn(state))
+
+    def test_states_are_uint8(self):
+        state = self.env.reset()
+        self.assertEqual(state.dtype, np.uint8)
+        next_state = self.env.get_next_state(state, 4)
+        self.assertEqual(next_state.dtype, np.uint8)
+        self.assertEqual(next_state[0, 1, 1], 1)
+        self.assertEqual(next_state.sum(), 1)
+        # the start state is shared, so it must not be changed
+        self.assertEqual(state.sum(), 0)
+
+    def test_incremental_hash(self):
+        state = self.env.reset()
+        state_hash = self.env.hash_state(state)
+        states = [state]
+        for action in (4, 9, 0, 17):
+            state, state_hash = self.env.get_next_state_with_hash(state, state_hash, action)
+            self.assertEqual(state_hash, self.env.hash_state(state))
+            states.append(state)
+        hashes = self.env.hash_states(np.array(states))
+        self.assertEqual(len(set(int(h) for h in hashes)), len(states))
+        self.assertEqual(int(hashes[-1]), state_hash)
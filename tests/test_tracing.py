@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import unittest
+
+from game import BatchRandomModel, self_play_game
+from tictactoe_env import TicTacToeEnv
+import tracing
+
+
+class TestTracing(unittest.TestCase):
+    def tearDown(self):
+        tracing.stop_tracing()
+
+    def test_span_is_noop_when_off(self):
+        self.assertFalse(tracing.is_tracing())
+        with tracing.span('ignored'):
+            pass
+        self.assertIsNone(tracing.stop_tracing())
+
+    def test_records_spans(self):
+        tracer = tracing.start_tracing()
+        with tracing.span('outer', 'test', step=1):
+            with tracing.span('inner', 'test'):
+                pass
+        self.assertEqual([event['name'] for event in tracer.events], ['inner', 'outer'])
+        outer = tracer.events[1]
+        self.assertEqual(outer['ph'], 'X')
+        self.assertEqual(outer['args'], {'step': 1})
+        self.assertGreaterEqual(outer['dur'], tracer.events[0]['dur'])
+
+    def test_self_play_trace_file(self):
+        env = TicTacToeEnv()
+        tracing.start_tracing()
+        self_play_game(BatchRandomModel(env, seed=0), env, n_leaf_expansions=5, max_num_turns=9)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            merged_path = os.path.join(directory, 'merged.json')
+            tracing.stop_tracing(path)
+            tracing.merge_traces([path, path], merged_path)
+            with open(path) as f:
+                events = json.load(f)['traceEvents']
+            with open(merged_path) as f:
+                merged_events = json.load(f)['traceEvents']
+        names = set(event['name'] for event in events)
+        self.assertEqual(names, set(['self_play_move', 'search', 'model_call']))
+        self.assertEqual(len(merged_events), 2 * len(events))
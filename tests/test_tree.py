@@ -1,6 +1,6 @@
 import unittest
 
-from tree import Node, Edge
+from tree import Node, Edge, NodePool, count_nodes, prune_to_subtree
 
 from utils import setup_simple_tree
 
@@ -13,6 +13,7 @@ class TestInit(unittest.TestCase):
         self.assertEqual(node.outgoing_edges, [])
         self.assertEqual(len(node.outgoing_edges), 0)
         self.assertEqual(node.in_edge, None)
+        self.assertEqual(node.state_hash, None)
 
     def test_node_edges(self):
         nodes = [Node(i) for i in range(7)]
@@ -44,3 +45,41 @@ class TestInit(unittest.TestCase):
         # parent of 3 is 1
         self.assertEqual(nodes[3].in_edge.in_node.state, 1)
         self.assertEqual(len(nodes[6].outgoing_edges), 0)
+
+
+class TestPruning(unittest.TestCase):
+
+    def test_count_nodes(self):
+        nodes = setup_simple_tree()
+        self.assertEqual(count_nodes(nodes[0]), 7)
+        self.assertEqual(count_nodes(nodes[1]), 3)
+        self.assertEqual(count_nodes(nodes[6]), 1)
+
+    def test_prune_to_subtree(self):
+        #      0
+        #   1     2
+        #  3 4   5 6
+        nodes = setup_simple_tree()
+        pool = NodePool()
+        num_kept, num_freed = prune_to_subtree(nodes[2], pool)
+        self.assertEqual(num_kept, 3)
+        self.assertEqual(num_freed, 4)
+        self.assertEqual(len(pool), 4)
+        self.assertEqual(nodes[2].in_edge, None)
+        self.assertEqual(len(nodes[2].outgoing_edges), 2)
+        self.assertEqual(nodes[2].outgoing_edges[0].out_node.state, 5)
+
+    def test_pool_reuses_nodes(self):
+        pool = NodePool(max_size=1)
+        node = Node('old', state_hash=1)
+        node.is_expanded = True
+        pool.release(node)
+        pool.release(Node('dropped'))
+        self.assertEqual(len(pool), 1)
+
+        recycled = pool.acquire('new', state_hash=2)
+        self.assertIs(recycled, node)
+        self.assertEqual(recycled.state, 'new')
+        self.assertEqual(recycled.state_hash, 2)
+        self.assertFalse(recycled.is_expanded)
+        self.assertEqual(len(pool), 0)
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+from game import BatchRandomModel, self_play_game
+from tictactoe_env import TicTacToeEnv
+from tree import Node, create_new_connection
+from tree_memory import TreeMemoryProfiler, format_memory_report, tree_memory_report
+
+from utils import setup_simple_tree
+
+
+class TestTreeMemoryReport(unittest.TestCase):
+    def test_counts_and_depths(self):
+        nodes = setup_simple_tree()
+        create_new_connection(nodes[3], None, 0, 1.0)
+        report = tree_memory_report(nodes[0])
+        self.assertEqual(report['num_nodes'], 7)
+        self.assertEqual(report['num_edges'], 7)
+        self.assertEqual(report['num_unexpanded_edges'], 1)
+        self.assertEqual([level['num_nodes'] for level in report['by_depth']], [1, 2, 4])
+        self.assertEqual(report['total_bytes'],
+                         report['node_bytes'] + report['edge_bytes'] + report['state_bytes'])
+        self.assertAlmostEqual(report['bytes_per_node'], report['total_bytes'] / 7)
+
+    def test_state_arrays(self):
+        state = np.zeros((8, 8, 13))
+        root = Node(state)
+        # a child sharing its parent's array is only counted once
+        create_new_connection(root, Node(state), 0, 0.5)
+        create_new_connection(root, Node(np.ones((8, 8, 13))), 1, 0.5)
+        report = tree_memory_report(root)
+        self.assertGreaterEqual(report['state_bytes'], 2 * state.nbytes)
+        self.assertLess(report['state_bytes'], 3 * state.nbytes)
+        self.assertGreaterEqual(report['by_depth'][0]['state_bytes'], state.nbytes)
+        self.assertGreaterEqual(report['by_depth'][1]['state_bytes'], state.nbytes)
+
+    def test_views_count_their_data(self):
+        states = np.zeros((2, 8, 8, 13))
+        report = tree_memory_report(Node(states[0]))
+        self.assertGreaterEqual(report['state_bytes'], states[0].nbytes)
+
+    def test_format(self):
+        text = format_memory_report(tree_memory_report(setup_simple_tree()[0]))
+        self.assertIn('7 nodes', text)
+        self.assertIn('depth 2: 4 nodes', text)
+
+
+class TestTreeMemoryProfiler(unittest.TestCase):
+    def test_records_every_move(self):
+        np.random.seed(0)
+        env = TicTacToeEnv()
+        profiler = TreeMemoryProfiler()
+        states, _, _ = self_play_game(BatchRandomModel(env, seed=0), env, n_leaf_expansions=10,
+                                      max_num_turns=9, callbacks=[profiler])
+        self.assertEqual(len(profiler.reports), len(states))
+        self.assertTrue(all(report['n_rollouts'] == 10 for report in profiler.reports))
+        self.assertTrue(all(report['num_nodes'] > 1 for report in profiler.reports))
+        self.assertEqual(len(profiler.growth()), len(states) - 1)
+        self.assertEqual(profiler.growth('num_nodes')[0],
+                         profiler.reports[1]['num_nodes'] - profiler.reports[0]['num_nodes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from zobrist import ZobristTable
+
+
+class TestZobristTable(unittest.TestCase):
+    def setUp(self):
+        self.table = ZobristTable((2, 3, 3))
+
+    def test_keys_are_stable(self):
+        np.testing.assert_array_equal(self.table.keys, ZobristTable((2, 3, 3)).keys)
+        self.assertEqual(self.table.keys.dtype, np.uint64)
+        self.assertEqual(len(np.unique(self.table.keys)), 18)
+
+    def test_hash_state(self):
+        state = np.zeros((2, 3, 3), dtype=np.uint8)
+        self.assertEqual(self.table.hash_state(state), 0)
+        state[0, 1, 1] = 1
+        state[1, 0, 2] = 1
+        self.assertEqual(self.table.hash_state(state), int(self.table.keys[0, 1, 1] ^ self.table.keys[1, 0, 2]))
+
+    def test_toggle(self):
+        state = np.zeros((2, 3, 3), dtype=np.uint8)
+        state[0, 1, 1] = 1
+        state_hash = self.table.toggle(0, (0, 1, 1))
+        self.assertEqual(state_hash, self.table.hash_state(state))
+        self.assertEqual(self.table.toggle(state_hash, (0, 1, 1)), 0)
+
+    def test_hash_states(self):
+        rng = np.random.RandomState(0)
+        states = rng.randint(0, 2, size=(5, 2, 3, 3)).astype(np.uint8)
+        hashes = self.table.hash_states(states)
+        self.assertEqual(hashes.dtype, np.uint64)
+        self.assertEqual([int(h) for h in hashes], [self.table.hash_state(state) for state in states])
+
+    def test_plane_key(self):
+        state = np.zeros((2, 3, 3), dtype=np.uint8)
+        state[..., 2] = 1
+        self.assertEqual(self.table.plane_key(2), self.table.hash_state(state))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import time
+
 import numpy as np
 
 from tree import Node, create_new_connection
@@ -31,6 +33,22 @@ def mock_model_numline(states):
     return (np.array(action_probs), np.array(values))
 
 
+def slow_mock_model_numline(states):
+    # gives worker threads a chance to overlap, like a real model releasing the GIL
+    time.sleep(0.001)
+    return mock_model_numline(states)
+
+
+def mock_model_one_sided(states):
+    # strongly prefers action 1, so search should settle on it quickly
+    action_probs = []
+    values = []
+    for state in states:
+        action_probs.append(np.array([0.01, 0.99]))
+        values.append(np.array([-1 if state % 2 else 1]))
+    return (np.array(action_probs), np.array(values))
+
+
 class MockEnv(object):
     """
     Functionality for the environment
@@ -85,6 +103,33 @@ class NumlineEnv(object):
 numline_env = NumlineEnv()
 
 
+class MockTrainableModel(object):
+    """
+    Stands in for a DualNet where a model is trained: a uniform policy over the legal
+    actions, and a single weight counting the training steps taken.  The class is its
+    own model factory.
+    """
+    def __init__(self, env, inference_only=False):
+        self.env = env
+        self.inference_only = inference_only
+        self.weights = {'steps': np.zeros(1)}
+
+    def __call__(self, states):
+        masks = np.array([self.env.get_legality_mask(state) for state in states], dtype=float)
+        totals = np.maximum(masks.sum(axis=1, keepdims=True), 1)
+        return masks / totals, np.zeros((len(states), 1))
+
+    def get_weights(self):
+        return {name: value.copy() for name, value in self.weights.items()}
+
+    def set_weights(self, weights):
+        self.weights = {name: np.array(value) for name, value in weights.items()}
+
+    def train(self, states, pi, z):
+        self.weights['steps'] += 1
+        return 0.0
+
+
 def setup_simple_tree():
     #      0
     #   1     2
@@ -101,6 +146,20 @@ def setup_simple_tree():
     return nodes
 
 
+def setup_visited_tree():
+    # setup_simple_tree with visit counts as if it had been searched
+    #      0
+    #   1     2
+    #  3 4   5 6
+    nodes = setup_simple_tree()
+    for node in nodes[:3]:
+        node.is_expanded = True
+    nodes[1].in_edge.num_visits = 5
+    nodes[2].in_edge.num_visits = 2
+    nodes[2].in_edge.total_action_value = 1.0
+    return nodes
+
+
 def setup_uneven_tree():
     #          0
     #     1        2
@@ -1,9 +1,13 @@
 import numpy as np
 
+from zobrist import ZobristTable
+
 
 class TicTacToeEnv(object):
 
-    START_STATE = np.zeros((2, 3, 3), dtype=int)
+    state_dtype = np.uint8
+    START_STATE = np.zeros((2, 3, 3), dtype=state_dtype)
+    input_shape = (2, 3, 3)
     action_size = 2*3*3
 
     def __init__(self):
@@ -14,12 +18,35 @@ class TicTacToeEnv(object):
         assume x's always go first
         """
         self.action_dims = (2, 3, 3)
+        self.zobrist = ZobristTable(self.input_shape)
 
     def get_next_state(self, state, action_int):
-        action_array = self.convert_int_to_action(action_int)
-        next_state = state + action_array
+        # the same as adding convert_int_to_action(action_int), without building the action array
+        next_state = state.copy()
+        next_state.flat[int(action_int)] += 1
         return next_state
 
+    def get_next_state_with_hash(self, state, state_hash, action_int):
+        """
+        Returns a tuple of (next_state, next_hash), the state after taking action_int and its
+        hash updated from state_hash, the hash of state.  Whose turn it is follows from the
+        pieces, so the move's square is the only key that changes.
+        """
+        next_hash = self.zobrist.toggle(state_hash, np.unravel_index(int(action_int), self.action_dims))
+        return self.get_next_state(state, action_int), next_hash
+
+    def hash_state(self, state):
+        """
+        Returns the 64 bit Zobrist hash of state as an int
+        """
+        return self.zobrist.hash_state(state)
+
+    def hash_states(self, states):
+        """
+        Returns a uint64 array of the Zobrist hashes of a batch of states
+        """
+        return self.zobrist.hash_states(states)
+
     def reset(self):
         return self.START_STATE
 
@@ -37,6 +64,19 @@ class TicTacToeEnv(object):
                     legal_actions.append(action_int)
         return np.array(legal_actions)
 
+    def get_legality_mask(self, state):
+        """
+        Returns a vector of length action_size with a 1 for every legal action
+        and 0 everywhere else.
+        """
+        move_legality_mask = np.zeros(self.action_size)
+        if self.is_game_over(state):
+            return move_legality_mask
+        turn_index = 0 if self.is_x_turn(state) else 1
+        empty_squares = state.sum(axis=0) == 0
+        move_legality_mask.reshape(self.action_dims)[turn_index] = empty_squares
+        return move_legality_mask
+
     def is_game_over(self, state):
         """
         Returns True if the state indicates the game is over.
@@ -0,0 +1,128 @@
+"""
+Optional tracing of the self-play pipeline in the Chrome trace event format, which can
+be loaded in chrome://tracing or Perfetto to see where threads and processes sit idle.
+
+    tracing.start_tracing()
+    self_play_game(model, env)
+    tracing.stop_tracing('trace.json')
+
+Traced code wraps its work in tracing.span(name, category).  While tracing is off, span
+returns a shared no-op context manager, so instrumented code pays almost nothing.
+"""
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+_tracer = None
+
+
+class _Span(object):
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add_span(self.name, self.category, self.start_time, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer(object):
+    """
+    Collects complete ('X') trace events for one process.  Timestamps are wall-clock
+    microseconds, so traces written by different processes line up when merged.
+    """
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        # perf_counter is precise but has an arbitrary origin, so anchor it to the wall clock once
+        self._wall_start = time.time()
+        self._perf_start = time.perf_counter()
+
+    def to_microseconds(self, perf_time):
+        return (self._wall_start + perf_time - self._perf_start) * 1e6
+
+    def span(self, name, category='', **args):
+        return _Span(self, name, category, args)
+
+    def add_span(self, name, category, start_time, end_time, args=None):
+        event = {'name': name,
+                 'cat': category,
+                 'ph': 'X',
+                 'ts': self.to_microseconds(start_time),
+                 'dur': (end_time - start_time) * 1e6,
+                 'pid': self.pid,
+                 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    def write(self, path):
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def start_tracing():
+    """
+    Starts recording spans in this process and returns the Tracer collecting them.
+    """
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing(path=None):
+    """
+    Stops recording spans, writing them to path if one is given.  Returns the Tracer.
+    """
+    global _tracer
+    tracer = _tracer
+    _tracer = None
+    if tracer is not None and path is not None:
+        tracer.write(path)
+    return tracer
+
+
+def is_tracing():
+    return _tracer is not None
+
+
+def span(name, category='', **args):
+    """
+    Returns a context manager that records a span covering its body while tracing is on.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, category, **args)
+
+
+def merge_traces(paths, output_path):
+    """
+    Combines traces written by several processes into a single trace file.
+    """
+    events = []
+    for path in paths:
+        with open(path) as f:
+            events.extend(json.load(f)['traceEvents'])
+    with open(output_path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -1,6 +1,8 @@
 class Node(object):
-    def __init__(self, state, outgoing_edges=None, in_edge=None):
+    def __init__(self, state, outgoing_edges=None, in_edge=None, state_hash=None):
         self.state = state
+        # Zobrist hash of state, None until known
+        self.state_hash = state_hash
         if outgoing_edges is not None:
             self.outgoing_edges = outgoing_edges
         else:
@@ -9,6 +11,17 @@ class Node(object):
         self.is_expanded = False
         self.is_terminal = False
 
+    def reset(self, state, state_hash=None):
+        """
+        Clears the node so it can be reused for a new state.
+        """
+        self.state = state
+        self.state_hash = state_hash
+        self.outgoing_edges = []
+        self.in_edge = None
+        self.is_expanded = False
+        self.is_terminal = False
+
     def add_outgoing_edge(self, edge):
         self.outgoing_edges.append(edge)
 
@@ -19,7 +32,8 @@ class Node(object):
         self.in_edge = edge
 
     def __repr__(self):
-        return 'Node. Children: {} State: {}'.format([edge.out_node.state for edge in self.outgoing_edges], self.state)
+        children = [edge.out_node.state if edge.out_node is not None else None for edge in self.outgoing_edges]
+        return 'Node. Children: {} State: {}'.format(children, self.state)
 
 
 class Edge(object):
@@ -31,7 +45,7 @@ class Edge(object):
                  num_visits=0,
                  total_action_value=0.0):
         self.in_node = in_node
-        self.out_node = out_node  # node
+        self.out_node = out_node  # node, None until the edge is first followed
         self.action = action
         self.num_visits = num_visits
         self.total_action_value = total_action_value
@@ -44,14 +58,128 @@ class Edge(object):
         return self.total_action_value / self.num_visits
 
     def __repr__(self):
-        return 'Edge. In: {} Out: {} Action: {}'.format(self.in_node.state, self.out_node.state, self.action)
+        out_state = self.out_node.state if self.out_node is not None else None
+        return 'Edge. In: {} Out: {} Action: {}'.format(self.in_node.state, out_state, self.action)
 
 
 def create_new_connection(parent_node, child_node, action, prior_probability):
     """
     Returns the edge connecting parent and child
+    child_node may be None, in which case it is attached later with connect_child
     """
     edge = Edge(parent_node, child_node, action, prior_probability)
     parent_node.add_outgoing_edge(edge)
-    child_node.add_incoming_edge(edge)
+    if child_node is not None:
+        child_node.add_incoming_edge(edge)
     return edge
+
+
+def connect_child(edge, child_node):
+    """
+    Attaches child_node to an edge that was created without one
+    """
+    edge.out_node = child_node
+    child_node.add_incoming_edge(edge)
+
+
+class NodePool(object):
+    """
+    Keeps nodes released from discarded parts of the search tree so that later
+    expansions can reuse them instead of allocating new ones.
+    max_size bounds how many free nodes are kept around.
+    """
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.free_nodes = []
+
+    def acquire(self, state, state_hash=None):
+        if self.free_nodes:
+            node = self.free_nodes.pop()
+            node.reset(state, state_hash)
+            return node
+        return Node(state, state_hash=state_hash)
+
+    def release(self, node):
+        # drop references so the released subtree can't keep anything else alive
+        node.reset(None)
+        if len(self.free_nodes) < self.max_size:
+            self.free_nodes.append(node)
+
+    def __len__(self):
+        return len(self.free_nodes)
+
+
+def new_node(state, node_pool=None, state_hash=None):
+    """
+    Returns a node for state, recycled from node_pool if one is given
+    """
+    if node_pool is None:
+        return Node(state, state_hash=state_hash)
+    return node_pool.acquire(state, state_hash)
+
+
+def count_nodes(root_node):
+    """
+    Returns the number of nodes in the tree rooted at root_node
+    """
+    num_nodes = 0
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        num_nodes += 1
+        stack.extend(edge.out_node for edge in node.outgoing_edges if edge.out_node is not None)
+    return num_nodes
+
+
+def release_subtree(root_node, node_pool=None):
+    """
+    Disconnects every node in the tree rooted at root_node, handing them to
+    node_pool if one is given.  Returns the number of nodes released.
+    """
+    num_released = 0
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        stack.extend(edge.out_node for edge in node.outgoing_edges if edge.out_node is not None)
+        if node_pool is not None:
+            node_pool.release(node)
+        else:
+            node.outgoing_edges = []
+            node.in_edge = None
+        num_released += 1
+    return num_released
+
+
+def collapse_node(node, node_pool=None):
+    """
+    Turns an expanded node back into an unexpanded leaf by releasing everything
+    below it.  The edge into node keeps its statistics.  Returns the number of
+    nodes released.
+    """
+    num_released = 0
+    for edge in node.outgoing_edges:
+        if edge.out_node is not None:
+            num_released += release_subtree(edge.out_node, node_pool)
+    node.outgoing_edges = []
+    node.is_expanded = False
+    return num_released
+
+
+def prune_to_subtree(node, node_pool=None):
+    """
+    Makes node the root of its own tree and releases every node outside of
+    its subtree.  Returns a tuple of (num_kept, num_freed).
+    """
+    if node.in_edge is None:
+        return count_nodes(node), 0
+    old_root = node.in_edge.in_node
+    while old_root.in_edge is not None:
+        old_root = old_root.in_edge.in_node
+
+    # cut node loose before releasing so its subtree is left untouched
+    edge = node.in_edge
+    edge.in_node.outgoing_edges.remove(edge)
+    node.in_edge = None
+
+    num_freed = release_subtree(old_root, node_pool)
+    return count_nodes(node), num_freed
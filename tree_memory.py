@@ -0,0 +1,110 @@
+import sys
+
+import numpy as np
+
+from search_callbacks import SearchCallback
+
+
+def object_bytes(obj):
+    """
+    Returns the size of obj itself plus its attribute dict, not counting what the
+    attributes refer to.
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def state_bytes(state):
+    # getsizeof includes the data of an array that owns it, but not the data behind a view
+    if isinstance(state, np.ndarray) and state.base is not None:
+        return sys.getsizeof(state) + state.nbytes
+    return sys.getsizeof(state)
+
+
+def tree_memory_report(root_node):
+    """
+    Walks the search tree rooted at root_node and returns a dict describing its memory use:
+    node and edge counts, bytes spent on nodes, edges and states, bytes per node, and a
+    per-depth breakdown of the states stored in the tree.
+
+    A state shared by several nodes is only counted once.
+    """
+    num_nodes = 0
+    num_edges = 0
+    num_unexpanded_edges = 0
+    node_bytes = 0
+    edge_bytes = 0
+    total_state_bytes = 0
+    by_depth = {}
+    seen_states = set()
+
+    stack = [(root_node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        num_nodes += 1
+        node_bytes += object_bytes(node) + sys.getsizeof(node.outgoing_edges)
+
+        level = by_depth.setdefault(depth, {'depth': depth, 'num_nodes': 0, 'state_bytes': 0})
+        level['num_nodes'] += 1
+        if id(node.state) not in seen_states:
+            seen_states.add(id(node.state))
+            size = state_bytes(node.state)
+            level['state_bytes'] += size
+            total_state_bytes += size
+
+        for edge in node.outgoing_edges:
+            num_edges += 1
+            edge_bytes += object_bytes(edge)
+            if edge.out_node is None:
+                num_unexpanded_edges += 1
+            else:
+                stack.append((edge.out_node, depth + 1))
+
+    total_bytes = node_bytes + edge_bytes + total_state_bytes
+    return {'num_nodes': num_nodes,
+            'num_edges': num_edges,
+            'num_unexpanded_edges': num_unexpanded_edges,
+            'node_bytes': node_bytes,
+            'edge_bytes': edge_bytes,
+            'state_bytes': total_state_bytes,
+            'total_bytes': total_bytes,
+            'bytes_per_node': total_bytes / num_nodes,
+            'by_depth': [by_depth[depth] for depth in sorted(by_depth)]}
+
+
+def format_memory_report(report):
+    """
+    Returns a human readable summary of a report from tree_memory_report
+    """
+    lines = ['{} nodes, {} edges ({} without a child yet)'.format(
+                 report['num_nodes'], report['num_edges'], report['num_unexpanded_edges']),
+             'total {:.1f} KB: nodes {:.1f} KB, edges {:.1f} KB, states {:.1f} KB, {:.0f} bytes per node'.format(
+                 report['total_bytes'] / 1024, report['node_bytes'] / 1024, report['edge_bytes'] / 1024,
+                 report['state_bytes'] / 1024, report['bytes_per_node'])]
+    for level in report['by_depth']:
+        lines.append('  depth {}: {} nodes, {:.1f} KB of states'.format(
+            level['depth'], level['num_nodes'], level['state_bytes'] / 1024))
+    return '\n'.join(lines)
+
+
+class TreeMemoryProfiler(SearchCallback):
+    """
+    Records a tree_memory_report of the search tree at the end of every search it observes.
+    Passed to self_play_game it gives one report per move, taken before the tree is pruned
+    to the chosen child, so the reports show how the tree grows over the game.
+    """
+    def __init__(self):
+        self.reports = []
+
+    def on_search_complete(self, root_node, n_rollouts, elapsed):
+        report = tree_memory_report(root_node)
+        report['n_rollouts'] = n_rollouts
+        self.reports.append(report)
+
+    def growth(self, key='total_bytes'):
+        """
+        Returns how much key changed from each recorded search to the next
+        """
+        return [after[key] - before[key] for before, after in zip(self.reports, self.reports[1:])]
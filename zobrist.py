@@ -0,0 +1,58 @@
+"""
+Zobrist hashing of env states.  Every entry of a state has a random 64 bit key, and a
+state's hash is the xor of the keys of its nonzero entries.  Flipping an entry changes the
+hash by xoring in that entry's key, so a move's hash can be updated from the hash before it
+without looking at the rest of the state.
+
+Keys come from a fixed seed, so hashes are the same in every process and run and can be
+used to key caches shared between workers.
+"""
+import numpy as np
+
+ZOBRIST_SEED = 20170712
+
+
+class ZobristTable(object):
+    """
+    Random keys for every entry of states of the given shape
+
+    Parameters
+    ----------
+    shape: tuple
+        shape of a single state
+    seed: int
+        seed the keys are drawn with
+    """
+    def __init__(self, shape, seed=ZOBRIST_SEED):
+        self.shape = tuple(shape)
+        rng = np.random.RandomState(seed)
+        self.keys = rng.randint(0, 2**63, size=self.shape, dtype=np.int64).view(np.uint64)
+        self.keys |= rng.randint(0, 2, size=self.shape, dtype=np.int64).view(np.uint64) << np.uint64(63)
+        self._flat_keys = self.keys.reshape(-1)
+
+    def hash_state(self, state):
+        """
+        Returns the hash of a single state as an int
+        """
+        return int(np.bitwise_xor.reduce(self._flat_keys[np.flatnonzero(state)]))
+
+    def hash_states(self, states):
+        """
+        Returns a uint64 array with the hash of each state in states
+        """
+        states = np.reshape(states, (len(states), -1))
+        keys = np.where(states != 0, self._flat_keys, np.uint64(0))
+        return np.bitwise_xor.reduce(keys, axis=1)
+
+    def toggle(self, state_hash, index):
+        """
+        Returns state_hash updated for flipping the entry at index, a tuple into a state
+        """
+        return state_hash ^ int(self.keys[index])
+
+    def plane_key(self, plane):
+        """
+        Returns the xor of the keys of every entry of the last axis' plane, which is what
+        flipping a whole plane, like a side to move plane, does to a hash
+        """
+        return int(np.bitwise_xor.reduce(self.keys[..., plane], axis=None))